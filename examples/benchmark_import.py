@@ -0,0 +1,37 @@
+"""This script measures the time taken to import the microImage module, and
+compares it with the time taken to import all of its dependencies.
+
+The dependencies of the module (matplotlib, ffmpeg, pims, scikit-image,
+bottleneck, Pillow) are only imported when a function requiring them is used,
+so importing the module should take a small fraction of the second time."""
+
+# Import the required external module(s)
+import statistics
+import subprocess
+import sys
+
+# Number of fresh interpreters used for each measurement
+n_repeats = 5
+
+# Measure the import time in a new interpreter
+def import_time(statement):
+
+    code = "import time; start = time.perf_counter(); " + statement + "; print(time.perf_counter() - start)"
+
+    times = []
+    for i in range(n_repeats):
+        output = subprocess.run([sys.executable, '-W', 'ignore', '-c', code], capture_output=True, text=True, check=True)
+        times.append( float(output.stdout) )
+
+    return statistics.median(times)
+
+# Import the module only
+module_time = import_time("import microImage")
+
+# Import all the dependencies of the module
+dependencies_time = import_time("import microImage, bottleneck, ffmpeg, matplotlib.pyplot, matplotlib.font_manager, matplotlib.widgets, pims, PIL.Image, skimage.io")
+
+# Display the results
+print('import microImage: {:.3f} s'.format(module_time))
+print('import microImage with all dependencies: {:.3f} s'.format(dependencies_time))
+print('Ratio: {:.1%}'.format(module_time / dependencies_time))
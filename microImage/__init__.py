@@ -1,11 +1,21 @@
 import numpy as np
 import os
 
-import microImage.correction as corr
-import microImage.image_classes as img
-import microImage.input_output as io
-import microImage.labelling as lbl
-import microImage.modification as mod
+from microImage.lazy_import import lazyImport
+from microImage.progress import OperationCancelled, ProgressObserver
+from microImage.storage import isDask
+
+# The submodules and their dependencies are loaded on first use
+aio = lazyImport('microImage.async_io')
+cal = lazyImport('microImage.calibration')
+corr = lazyImport('microImage.correction')
+img = lazyImport('microImage.image_classes')
+io = lazyImport('microImage.input_output')
+lbl = lazyImport('microImage.labelling')
+mod = lazyImport('microImage.modification')
+prb = lazyImport('microImage.probe')
+prv = lazyImport('microImage.preview')
+rfc = lazyImport('microImage.reference_cache')
 
 ##-\-\-\-\-\-\-\-\-\-\-\
 ## INPUT/OUTPUT FUNCTIONS
@@ -19,10 +29,45 @@ def openImage(path):
 
 # ---------------------------------------
 # Open the image and load it into a class
-def loadImage(path, name = None):
+def loadImage(path, name = None, out_of_core=False, scratch_dir=None, bin_time=1, bin_space=1, bin_reduce='mean', calibration=None, progress=None):
+
+    # The space scale can only describe square pixels
+    bin_time, bin_y, bin_x = mod._get_bin_sizes(bin_time, bin_space)
+    if bin_y != bin_x:
+        raise Exception("The space binning should be the same along X and Y to keep the space scale of the stack.")
 
     # Open the image
-    imageArray = io.loadImage(path)
+    imageArray = io.loadImage(path, out_of_core=out_of_core, scratch_dir=scratch_dir, bin_time=bin_time, bin_space=bin_space, bin_reduce=bin_reduce, calibration=calibration, progress=progress)
+
+    # Extract the name of the file
+    if name is None:
+        a,name = os.path.split(path)
+        if name == "":
+            a,name = os.path.split(a)
+
+    imageStack = img.getImageClass(imageArray, name=name, out_of_core=out_of_core, scratch_dir=scratch_dir)
+
+    # Calibrate the binned stack in raw frames and pixels
+    imageStack.setScale(time_scale=bin_time, space_scale=bin_x)
+
+    return imageStack
+
+# ---------------------------------------------------------
+# Prepare the dark and flat field correction applied when loading
+def loadCalibration(dark=None, flat=None, dtype=None):
+    return cal.loadCalibration(dark=dark, flat=flat, dtype=dtype)
+
+# -------------------------------------------
+# Remove the master frames and calibrations cached
+def clearCalibrations():
+    cal.clearCalibrations()
+
+# ------------------------------------------------
+# Load a small preview of the image into a class
+def loadPreview(path, name=None, max_size=256, frames=None, percentile=1):
+
+    # Open the preview
+    previewArray = prv.loadPreview(path, max_size=max_size, frames=frames)
 
     # Extract the name of the file
     if name is None:
@@ -30,22 +75,81 @@ def loadImage(path, name = None):
         if name == "":
             a,name = os.path.split(a)
 
-    return img.getImageClass(imageArray, name=name)
+    imageStack = img.getImageClass(previewArray, name=name)
+
+    # Get the contrast limits from the preview only
+    imageStack.contrastCorrection(percentile=percentile)
+
+    return imageStack
+
+# ------------------------------------------------------
+# Open a video and read its frames only when requested
+def openVideo(path):
+    return io.openVideo(path)
+
+# ----------------------------------------------------
+# Get the shape, type and size of an image without loading it
+def probeImage(path):
+    return prb.probeImage(path)
 
 # --------------------------
 # Load an array into a class
-def loadArray(array, name='Untitled'):
-    return img.getImageClass(array, name=name)
+def loadArray(array, name='Untitled', out_of_core=False, scratch_dir=None):
+    return img.getImageClass(array, name=name, out_of_core=out_of_core, scratch_dir=scratch_dir)
+
+# ----------------------------------------------------
+# Reopen a stack saved with .saveSession(), without copy
+def loadSession(path, in_memory=False):
+    return img.loadSession(path, in_memory=in_memory)
+
+# ---------------------------------------------------------
+# Load a stack shared by another process, without copying it
+def attachStack(shared_stack):
+    return shared_stack.attach()
+
+# ------------------------------------------
+# Generate the frames added to a folder
+def watchFolder(path, interval=0.5, timeout=None, include_existing=False):
+    return io.watchFolder(path, interval=interval, timeout=timeout, include_existing=include_existing)
 
 # -----------------------------
 # Save the image frame or stack
-def saveImage(array, path, default=".tif", bit_depth=8, rescale=True):
-    io.saveImage(array, path, default=default, bit_depth=bit_depth, rescale=rescale)
+def saveImage(array, path, default=".tif", bit_depth=8, rescale=True, tile_size=None, pyramid=True, workers=None, progress=None):
+    io.saveImage(array, path, default=default, bit_depth=bit_depth, rescale=rescale, tile_size=tile_size, pyramid=pyramid, workers=workers, progress=progress)
 
 # -------------------------
 # Save the array as a video
-def saveVideo(array, path, fps=25, video_codec='libx264'):
-    io.saveVideo(path, array, fps=fps, video_codec=video_codec)
+def saveVideo(array, path, fps=25, video_codec='libx264', progress=None):
+    io.saveVideo(path, array, fps=fps, video_codec=video_codec, progress=progress)
+
+##-\-\-\-\-\-\-\-\-\-\-\-\-\
+## ASYNCHRONOUS INPUT/OUTPUT
+##-/-/-/-/-/-/-/-/-/-/-/-/-/
+
+# ----------------------------------------------
+# Set the number of threads used by the async jobs
+def setAsyncWorkers(workers=4):
+    aio.setAsyncWorkers(workers=workers)
+
+# -----------------------------------------------------
+# Open the image and return an array without blocking
+async def openImageAsync(path):
+    return await aio.loadImage(path)
+
+# ---------------------------------------------------
+# Open the image and load it into a class without blocking
+async def loadImageAsync(path, name = None, out_of_core=False, scratch_dir=None, bin_time=1, bin_space=1, bin_reduce='mean', calibration=None, progress=None):
+    return await aio.runAsync(loadImage, path, name=name, out_of_core=out_of_core, scratch_dir=scratch_dir, bin_time=bin_time, bin_space=bin_space, bin_reduce=bin_reduce, calibration=calibration, progress=progress)
+
+# -----------------------------------------------
+# Save the image frame or stack without blocking
+async def saveImageAsync(array, path, default=".tif", bit_depth=8, rescale=True, tile_size=None, pyramid=True, workers=None, progress=None):
+    await aio.saveImage(array, path, default=default, bit_depth=bit_depth, rescale=rescale, tile_size=tile_size, pyramid=pyramid, workers=workers, progress=progress)
+
+# --------------------------------------------
+# Save the array as a video without blocking
+async def saveVideoAsync(array, path, fps=25, video_codec='libx264', progress=None):
+    await aio.saveVideo(path, array, fps=fps, video_codec=video_codec, progress=progress)
 
 ##-\-\-\-\-\-\-\-\
 ## IMAGE CORRECTION
@@ -53,20 +157,55 @@ def saveVideo(array, path, fps=25, video_codec='libx264'):
 
 # ---------------------------------------
 # Remove the background of an image stack
-def backgroundCorrection(array, signed_bits=False, average='mean', correction='division'):
+def backgroundCorrection(array, signed_bits=False, average='mean', correction='division', workers=None, dtype=None, progress=None, reference=None, cache=False):
 
     # Apply the background correction
     corrected_array = corr.backgroundCorrection(array,
         signed_bits=signed_bits,
         average=average,
-        correction=correction
+        correction=correction,
+        workers=workers,
+        dtype=dtype,
+        progress=progress,
+        reference=reference,
+        cache=cache
         )
 
     return corrected_array
 
+# ------------------------------------------------
+# Calculate the background reference of the stack
+def getReference(array, signed_bits=False, average='mean', workers=None, cache=False, progress=None):
+    return corr.getReferenceImage(array, average=average, signed_bits=signed_bits, workers=workers, cache=cache, progress=progress)
+
+# -----------------------------------------------------
+# Keep the background references in memory and on the disk
+def setReferenceCache(max_size=8, cache_dir=None):
+    rfc.setReferenceCache(max_size=max_size, cache_dir=cache_dir)
+
+# -------------------------------------
+# Remove the background references cached
+def clearReferenceCache(disk=False):
+    rfc.clearReferenceCache(disk=disk)
+
+# ---------------------------------------------
+# Estimate the drift of the frames of the stack
+def estimateDrift(array, reference='first', workers=None, dtype=None, progress=None):
+    return corr.estimateDrift(array, reference=reference, workers=workers, dtype=dtype, progress=progress)
+
+# ------------------------------------
+# Remove the drift of the stack frames
+def driftCorrection(array, reference='first', shifts=None, fill_value=0, workers=None, dtype=None, progress=None):
+    return corr.driftCorrection(array, reference=reference, shifts=shifts, fill_value=fill_value, workers=workers, dtype=dtype, progress=progress)
+
+# --------------------------------------------------
+# Correct the changes of intensity between the frames
+def flickerCorrection(array, statistic='mean', percentile=50, target='first', window=25, workers=None, dtype=None, progress=None):
+    return corr.flickerCorrection(array, statistic=statistic, percentile=percentile, target=target, window=window, workers=workers, dtype=dtype, progress=progress)
+
 # ---------------------------------
 # Correct the contrast of the image
-def contrastCorrection(array, min=None, max=None, percentile=10, percentile_min=None, rescale=True):
+def contrastCorrection(array, min=None, max=None, percentile=10, percentile_min=None, rescale=True, dtype=None, workers=None):
 
     # Get the limits
     old_limits, new_limits = corr.setContrastCorrection(array,
@@ -77,11 +216,21 @@ def contrastCorrection(array, min=None, max=None, percentile=10, percentile_min=
         rescale=rescale
         )
 
+    # Process the frames of the stack in parallel
+    if workers is not None and len(array.shape) == 3:
+        corrected_array = corr.doStackContrastCorrection(array, old_limits, new_limits, workers=workers, dtype=dtype)
+
     # Process the array
-    corrected_array = corr.doContrastCorrection(array, old_limits, new_limits)
+    else:
+        corrected_array = corr.doContrastCorrection(array, old_limits, new_limits, dtype=dtype)
 
     return corrected_array
 
+# ---------------------------------------------
+# Project the stack along time (max/min/mean/std)
+def projectStack(array, type='max', window=None):
+    return corr.temporalProjection(array, type=type, window=window)
+
 # -------------------------------------------------
 # Display the pixel value distribution of the input
 def showPVD(array, n_bins=1000, min=None, max=None, percentile=10, percentile_min=None, log_scale=None):
@@ -96,17 +245,22 @@ def showPVD(array, n_bins=1000, min=None, max=None, percentile=10, percentile_mi
 def cropImage(array, top_left=(0,0), bottom_right=None):
     return mod.crop(array, top_left=top_left, bottom_right=bottom_right)
 
+# --------------------------------------
+# Bin the image in time and/or in space
+def binImage(array, time=1, space=1, reduce='mean'):
+    return mod.binning(array, time=time, space=space, reduce=reduce)
+
 # ----------------------------
 # Add time stamp on the frames
-def addTime(array, time_unit='frame', time_scale=1, font_size=None, font='Arial.ttf', padding=10, position='top', white_text=False):
-    return lbl.timeStamps(array, time_unit=time_unit, time_scale=time_scale, font_size=font_size, font=font, padding=padding, position=position, white_text=white_text)
+def addTime(array, time_unit='frame', time_scale=1, font_size=None, font='Arial.ttf', padding=10, position='top', white_text=False, progress=None):
+    return lbl.timeStamps(array, time_unit=time_unit, time_scale=time_scale, font_size=font_size, font=font, padding=padding, position=position, white_text=white_text, progress=progress)
 
 # -------------------------------
 # Add a scale bar on the frame(s)
 def addBar(array, space_unit='px', space_scale=1, scale_length=20, thickness=20, padding=10, white_bar=False, add_text=False, font='Arial.ttf', font_size=None):
 
-    # Process multiple frames
-    if len(array.shape) == 3:
+    # Process multiple frames, dask arrays are processed at once
+    if len(array.shape) == 3 and not isDask(array):
         new_array = []
         for frame in array:
             new_array.append( lbl.scaleBar(frame, space_unit=space_unit, space_scale=space_scale, scale_length=scale_length, thickness=thickness, padding=padding, white_bar=white_bar, add_text=add_text, font=font, font_size=font_size) )
@@ -0,0 +1,139 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import numpy as np
+import os
+
+import microImage.input_output as io
+from microImage.lazy_import import lazyImport
+from microImage.progress import Progress, ProgressObserver
+from microImage.storage import _frame_blocks
+
+# Heavy dependencies, loaded on first use
+ffmpeg = lazyImport('ffmpeg')
+
+##-\-\-\-\-\-\-\-\-\
+## PRIVATE FUNCTIONS
+##-/-/-/-/-/-/-/-/-/
+
+# Executor shared by all the asynchronous jobs
+_executor = None
+_max_workers = 4
+
+# ------------------------------------------------
+# Get the executor used for decoding and encoding
+def _get_executor():
+    global _executor
+
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=_max_workers, thread_name_prefix='microImage')
+
+    return _executor
+
+# ------------------------------------------------------------
+# Class relaying the progress of a thread, cancelled with its task
+class _TaskObserver(ProgressObserver):
+    def __init__(self, callback=None):
+        super().__init__()
+        self.callback = callback
+
+    # ------------------------------------------
+    # Send the progress to the observer of the user
+    def update(self, info):
+        if self.callback is not None and self.callback(info) is False:
+            self.cancel()
+
+    # ------------------------------------------------------
+    # Check if the task or the observer of the user was cancelled
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set() or getattr(self.callback, 'cancelled', False)
+
+##-\-\-\-\-\-\-\-\
+## PUBLIC FUNCTIONS
+##-/-/-/-/-/-/-/-/
+
+# -----------------------------------------------
+# Set the number of threads used by the async jobs
+def setAsyncWorkers(workers=4):
+    global _executor, _max_workers
+
+    # Close the current executor once its jobs are done
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+
+    _max_workers = workers
+
+# ------------------------------------------------
+# Run a blocking function in the bounded executor
+async def runAsync(function, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+
+    # Relay the progress of functions that can be cancelled
+    observer = None
+    if 'progress' in kwargs:
+        observer = _TaskObserver(kwargs['progress'])
+        kwargs['progress'] = observer
+
+    try:
+        return await loop.run_in_executor(_get_executor(), partial(function, *args, **kwargs))
+
+    # Stop the thread at the end of its current block if the task is cancelled
+    except asyncio.CancelledError:
+        if observer is not None:
+            observer.cancel()
+        raise
+
+# ----------------------------------
+# Load an image, a stack or a folder
+async def loadImage(path, out_of_core=False, scratch_dir=None, bin_time=1, bin_space=1, bin_reduce='mean', calibration=None, progress=None):
+    return await runAsync(io.loadImage, path, out_of_core=out_of_core, scratch_dir=scratch_dir, bin_time=bin_time, bin_space=bin_space, bin_reduce=bin_reduce, calibration=calibration, progress=progress)
+
+# ----------------------
+# Save an image or stack
+async def saveImage(array, path, default=".tif", bit_depth=8, rescale=True, tile_size=None, pyramid=True, workers=None, progress=None):
+    await runAsync(io.saveImage, array, path, default=default, bit_depth=bit_depth, rescale=rescale, tile_size=tile_size, pyramid=pyramid, workers=workers, progress=progress)
+
+# -------------------------
+# Save the array as a video
+async def saveVideo(file_name, array, fps=25, video_codec='libx264', progress=None):
+
+    # Check the extension of the given file
+    path = io._check_extensions( [file_name], extensions=['.mp4'] )[0]
+
+    # Get the conversion limits of the whole array
+    limits = None
+    if array.dtype != np.uint8:
+        limits = await runAsync(io._get_bit_depth_limits, array, bit_depth=8, rescale=True)
+
+    # Start the ffmpeg subprocess
+    height, width = array.shape[1], array.shape[2]
+    arguments = ffmpeg.compile( io._get_video_stream(path, width, height, fps=fps, video_codec=video_codec) )
+    process = await asyncio.create_subprocess_exec(*arguments, stdin=asyncio.subprocess.PIPE)
+
+    tracker = Progress(progress, 'saveVideo', array.shape[0])
+    try:
+
+        # Convert and write the frames block by block
+        for block in _frame_blocks(array, itemsize=3):
+            rgb_array = await runAsync(io._convert_to_RGB, array[block], limits=limits)
+
+            # Wait for ffmpeg to process the frames before sending more
+            process.stdin.write( rgb_array.tobytes() )
+            await process.stdin.drain()
+            tracker.update(block.stop - block.start, nbytes=rgb_array.nbytes)
+
+        # Terminate the process
+        process.stdin.close()
+        await process.wait()
+
+    # Stop ffmpeg and remove the partial video if the writing failed or was cancelled
+    except BaseException:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+
+        if os.path.exists(path):
+            os.remove(path)
+        raise
@@ -0,0 +1,145 @@
+import numpy as np
+import os
+
+from microImage.correction import temporalProjection, _round_frames
+from microImage.input_output import loadImage
+
+# Master frames already averaged, by path, modification time and size
+_master_frames = {}
+
+# Calibrations already prepared, by master frames and type
+_calibrations = {}
+
+##-\-\-\-\-\-\-\-\-\
+## PRIVATE FUNCTIONS
+##-/-/-/-/-/-/-/-/-/
+
+# ---------------------------------------------------
+# Get the key identifying the current version of a file
+def _get_file_key(path):
+    path = os.path.abspath(path)
+    file_stat = os.stat(path)
+
+    return path, file_stat.st_mtime_ns, file_stat.st_size
+
+# -------------------------------------------------------------
+# Get the master frame averaged over a stack, a file or a folder
+def _get_master_frame(frame):
+
+    # Average the frames of a file or folder only once
+    if isinstance(frame, str):
+        key = _get_file_key(frame)
+        if key not in _master_frames:
+            _master_frames[key] = _get_master_frame( loadImage(frame) )
+
+        return _master_frames[key]
+
+    # Average the frames of a stack
+    frame = np.asarray(frame)
+    if len(frame.shape) == 3:
+        frame = temporalProjection(frame, type='mean')
+
+    return frame.astype(np.float32)
+
+# ------------------------------------------------
+# Get the key identifying a master frame in the cache
+def _get_master_key(frame):
+
+    if frame is None:
+        return None
+    elif isinstance(frame, str):
+        return _get_file_key(frame)
+
+    return None
+
+##-\-\-\-\-\-\-\-\-\-\
+## CALIBRATION CLASS
+##-/-/-/-/-/-/-/-/-/-/
+
+# -------------------------------------------------------------
+# Class to correct the frames with the dark and flat field frames
+class Calibration:
+    def __init__(self, dark=None, flat=None, dtype=None):
+
+        # Load the master frames
+        self.dark = None if dark is None else _get_master_frame(dark)
+        self.flat = None if flat is None else _get_master_frame(flat)
+
+        # Keep the type of the raw frames if none is given
+        self.dtype = None if dtype is None else np.dtype(dtype)
+
+        # Check the shape of the master frames
+        if self.dark is not None and self.flat is not None and self.dark.shape != self.flat.shape:
+            raise Exception("The dark frame "+str(self.dark.shape)+" and the flat frame "+str(self.flat.shape)+" should have the same size.")
+
+        # Precompute the gain, keeping the average intensity of the flat frame
+        self.gain = None
+        if self.flat is not None:
+            illumination = self.flat
+            if self.dark is not None:
+                illumination = illumination - self.dark
+
+            valid_pixels = illumination > 0
+            if not np.any(valid_pixels):
+                raise Exception("The flat frame should be brighter than the dark frame.")
+
+            self.gain = np.divide(np.mean(illumination[valid_pixels]), illumination, out=np.ones(illumination.shape, dtype=np.float32), where=valid_pixels).astype(np.float32)
+
+    # ---------------------------------------------
+    # Correct a frame or a stack with the master frames
+    def apply(self, array, out=None):
+
+        # Check the size of the frames
+        master_frame = self.dark if self.dark is not None else self.gain
+        if master_frame is not None and array.shape[-2:] != master_frame.shape:
+            raise Exception("The size of the frames "+str(array.shape[-2:])+" does not match the size of the calibration "+str(master_frame.shape)+".")
+
+        # Calculate in single precision: (raw - dark) * gain
+        if self.dark is not None:
+            frames = np.subtract(array, self.dark, dtype=np.float32)
+        else:
+            frames = np.array(array, dtype=np.float32)
+
+        if self.gain is not None:
+            np.multiply(frames, self.gain, out=frames)
+
+        # Convert to the requested type, or back to the type of the raw frames
+        data_type = array.dtype if self.dtype is None else self.dtype
+        frames = _round_frames(frames, data_type).astype(data_type, copy=False)
+        if out is None:
+            return frames
+
+        out[...] = frames
+        return out
+
+    # -------------------------------------
+    # Correct the frames while they are read
+    def frames(self, frames):
+        for frame in frames:
+            yield self.apply(frame)
+
+##-\-\-\-\-\-\-\-\
+## PUBLIC FUNCTIONS
+##-/-/-/-/-/-/-/-/
+
+# --------------------------------------------------------
+# Get the calibration of the given files, prepared only once
+def loadCalibration(dark=None, flat=None, dtype=None):
+
+    # Arrays given directly are not cached
+    keys = [_get_master_key(frame) for frame in [dark, flat]]
+    if any([key is None and frame is not None for key, frame in zip(keys, [dark, flat])]):
+        return Calibration(dark=dark, flat=flat, dtype=dtype)
+
+    # Prepare the calibration of the files once
+    key = (*keys, None if dtype is None else np.dtype(dtype).str)
+    if key not in _calibrations:
+        _calibrations[key] = Calibration(dark=dark, flat=flat, dtype=dtype)
+
+    return _calibrations[key]
+
+# -------------------------------------------
+# Remove the master frames and calibrations cached
+def clearCalibrations():
+    _master_frames.clear()
+    _calibrations.clear()
@@ -1,14 +1,122 @@
-import bottleneck as bn
-import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+import math
+from multiprocessing import shared_memory
 import numpy as np
 
+from microImage.lazy_import import lazyImport
+from microImage.progress import Progress
+from microImage.reference_cache import getFingerprint, getReferenceCache, _get_key
+from microImage.storage import isDask, isOnDisk, _get_block_size, _get_blocks, _frame_blocks, _map_blocks, _map_tiles
+
+# Heavy dependencies, loaded on first use
+bn = lazyImport('bottleneck')
+plt = lazyImport('matplotlib.pyplot')
+sfft = lazyImport('scipy.fft')
+
+# Optional dependencies, only used with dask arrays
+dask = lazyImport('dask')
+da = lazyImport('dask.array')
+
 ##-\-\-\-\-\-\-\-\-\
 ## PRIVATE FUNCTIONS
 ##-/-/-/-/-/-/-/-/-/
 
+# Arrays larger than this are processed in single precision by default (in bytes, in double precision)
+_large_array = 256 * 1024**2
+
+# Width of the correlation peak used to estimate the drift (in pixels)
+_peak_width = 1
+
+# ----------------------------------------------
+# Get the floating type used for the calculations
+def _get_work_type(array, dtype=None):
+
+    # Use the type given by the user
+    if dtype is not None:
+        return np.dtype(dtype)
+
+    # Use single precision for large arrays
+    if array.size * 8 > _large_array:
+        return np.dtype(np.float32)
+
+    return np.dtype(np.float64)
+
+# ----------------------------------------
+# Count the pixel values of an integer array
+def _get_histogram(array):
+
+    # Count dask arrays chunk by chunk
+    if isDask(array):
+        return _get_dask_histogram(array)
+
+    # Shift signed values to positive indices
+    first_value = int(np.iinfo(array.dtype).min)
+    values = np.ravel(array)
+    if first_value != 0:
+        values = values.astype(np.int64) - first_value
+
+    # Count all possible values of the type
+    counts = np.bincount(values, minlength=2**(8*array.dtype.itemsize))
+
+    return counts, first_value
+
+# ---------------------------------------------------
+# Count the pixel values of a dask array chunk by chunk
+def _get_dask_histogram(array):
+
+    # Count the values of each chunk
+    counts = [dask.delayed(_count_values)(chunk) for chunk in array.to_delayed().ravel()]
+
+    # Sum the counts by pairs to keep few histograms in memory
+    while len(counts) > 1:
+        counts = [dask.delayed(np.add)(*counts[i:i+2]) if i+1 < len(counts) else counts[i] for i in range(0, len(counts), 2)]
+
+    return counts[0].compute(), int(np.iinfo(array.dtype).min)
+
+# ---------------------------------------
+# Count the pixel values of a single chunk
+def _count_values(array):
+    return _get_histogram(array)[0]
+
+# -------------------------------------------
+# Get the extreme values stored in a histogram
+def _get_histogram_limits(histogram):
+
+    # Get the filled bins
+    counts, first_value = histogram
+    filled_bins = np.nonzero(counts)[0]
+
+    return filled_bins[0] + first_value, filled_bins[-1] + first_value
+
+# ----------------------------------------------
+# Calculate a percentile from the pixel histogram
+def _get_histogram_percentile(histogram, percentile):
+
+    # Get the cumulative histogram
+    counts, first_value = histogram
+    cumulative = np.cumsum(counts)
+
+    # Get the position of the percentile in the sorted values
+    position = (cumulative[-1] - 1) * (percentile / 100)
+    previous_index = np.floor(position)
+    next_index = np.minimum(previous_index + 1, cumulative[-1] - 1)
+    gamma = position - previous_index
+
+    # Get the values at the surrounding positions
+    previous_value = np.float64( np.searchsorted(cumulative, previous_index, side='right') + first_value )
+    next_value = np.float64( np.searchsorted(cumulative, next_index, side='right') + first_value )
+
+    # Interpolate linearly, similarly to np.percentile
+    difference = next_value - previous_value
+    if gamma >= 0.5:
+        return next_value - difference * (1 - gamma)
+
+    return previous_value + difference * gamma
+
 # ------------------------------------------------------
 # Get the min and max value to define the contrast scale
-def _get_min_max(array, min=None, max=None, percentile=10, percentile_min=None):
+def _get_min_max(array, min=None, max=None, percentile=10, percentile_min=None, histogram=None):
 
     # Calculate the min value
     if min is None:
@@ -17,26 +125,51 @@ def _get_min_max(array, min=None, max=None, percentile=10, percentile_min=None):
         if percentile_min is None:
             percentile_min = percentile
 
-        min = np.percentile(array, percentile_min)
+        if histogram is not None:
+            min = _get_histogram_percentile(histogram, percentile_min)
+        else:
+            min = _get_percentile(array, percentile_min)
 
     # Calculate the max value
     if max is None:
 
         percentile = 100 - percentile
 
-        max = np.percentile(array, percentile)
+        if histogram is not None:
+            max = _get_histogram_percentile(histogram, percentile)
+        else:
+            max = _get_percentile(array, percentile)
 
     return min, max
 
+# ----------------------------------
+# Calculate a percentile of the array
+def _get_percentile(array, percentile):
+
+    # Merge the percentiles of the chunks of dask arrays (approximation)
+    if isDask(array):
+        return da.percentile(array.ravel(), [percentile]).compute()[0]
+
+    return np.percentile(array, percentile)
+
 # ------------------------------------------------
 # Define the new scale for the contrast correction
-def _get_scale(array, min=None, max=None, rescale=True):
+def _get_scale(array, min=None, max=None, rescale=True, histogram=None):
+
+    # Get the extreme values of the array
+    if histogram is not None:
+        array_min, array_max = _get_histogram_limits(histogram)
+    else:
+        array_min, array_max = None, None
 
     # Get the new min value
     if min is None:
         if rescale:
             min = 0
 
+        elif array_min is not None:
+            min = array_min
+
         else:
             min = np.amin(array)
 
@@ -45,6 +178,9 @@ def _get_scale(array, min=None, max=None, rescale=True):
         if rescale and issubclass(array.dtype.type, np.integer):
             max = np.iinfo(array.dtype).max
 
+        elif array_max is not None:
+            max = array_max
+
         else:
             max = np.amax(array)
 
@@ -52,39 +188,142 @@ def _get_scale(array, min=None, max=None, rescale=True):
 
 # ------------------------------
 # Rescale the value in the array
-def _rescale_array(array, old_limits, new_limits):
+def _rescale_array(array, old_limits, new_limits, dtype=None, out=None):
 
-    # Save the data type
-    data_type = array.dtype
-    array = array.astype(np.float64)
+    # Get the types of the arrays
+    work_type = _get_work_type(array, dtype=dtype)
+    if out is None:
+        out = np.empty(array.shape, dtype=array.dtype)
 
     # Get the limits
     old_min, old_max = old_limits
     new_min, new_max = new_limits
+    scale = (new_max - new_min) / (old_max - old_min)
 
-    # Rescale to 0 - 1
-    unit_array = (array - old_min) / (old_max - old_min)
-    unit_array[unit_array < 0] == 0
-    unit_array[unit_array > 1] == 1
+    # Calculate directly in the output array if possible
+    direct = out.dtype == work_type
+    block_size = _get_block_size(array.shape, itemsize=work_type.itemsize)
+    if not direct:
+        buffer = np.empty((min(block_size, array.shape[0]), *array.shape[1:]), dtype=work_type)
 
-    # Rescale to the new limits
-    new_array = unit_array * (new_max - new_min) + new_min
+    # Process the array block by block
+    for block in _get_blocks(array.shape[0], block_size):
+        if direct:
+            unit_array = out[block]
+        else:
+            unit_array = buffer[:block.stop - block.start]
 
-    return new_array.astype(data_type)
+        # Rescale to 0 - (old max - old min)
+        np.subtract(array[block], old_min, out=unit_array, dtype=work_type)
+        np.clip(unit_array, 0, old_max - old_min, out=unit_array)
 
-# ------------------------------
-# Correct for signed bits images
-def _correct_signed_bits(array):
-    return array - (((np.iinfo(array.dtype).max+1)/2)-1)
+        # Rescale to the new limits
+        np.multiply(unit_array, scale, out=unit_array)
+        np.add(unit_array, new_min, out=unit_array)
+
+        if not direct:
+            out[block] = unit_array
+
+    return out
+
+# ------------------------------------------
+# Get the offset to apply on signed bits images
+def _get_signed_offset(data_type):
+    return ((np.iinfo(data_type).max+1)/2)-1
+
+# ---------------------------------------------------
+# Check if the median can be computed by counting values
+def _is_countable(array):
+    return issubclass(array.dtype.type, np.integer) and array.dtype.itemsize <= 2
+
+# --------------------------------------------------------
+# Select the values of the given ranks in each pixel of a tile
+def _select_integer_ranks(array, rows, ranks, block_memory=None):
+
+    # Get the properties of the tile
+    n_bits = array.dtype.itemsize * 8
+    value_offset = -np.iinfo(array.dtype).min
+    n_pixels = (rows.stop - rows.start) * int(np.prod(array.shape[2:]))
+    pixel_index = np.arange(n_pixels)
+
+    block_size = _get_block_size((array.shape[0], n_pixels), itemsize=8, block_memory=block_memory)
+
+    # Initialise the selection
+    prefixes = [np.zeros(n_pixels, dtype=np.int64) for _ in ranks]
+    remaining = [np.full(n_pixels, rank, dtype=np.int64) for rank in ranks]
+
+    # Select the values byte by byte, starting from the most significant
+    for shift in range(n_bits - 8, -1, -8):
+
+        # Count the values of the byte
+        histograms = []
+        for i in range(len(ranks)):
+
+            # Share the histogram between ranks with the same prefix
+            if i > 0 and np.array_equal(prefixes[i], prefixes[0]):
+                histograms.append(histograms[0])
+                continue
+
+            counts = np.zeros(256 * n_pixels, dtype=np.int64)
+            for block in _get_blocks(array.shape[0], block_size):
+                values = np.asarray(array[block, rows]).reshape(-1, n_pixels).astype(np.int64) + value_offset
+
+                # Get the index of the byte value in the histograms
+                index = pixel_index * 256 + ((values >> shift) & 255)
+
+                # Only count the values matching the previous bytes
+                if shift < n_bits - 8:
+                    index = index[(values >> (shift + 8)) == prefixes[i]]
+
+                counts += np.bincount(index.ravel(), minlength=256 * n_pixels)
+
+            histograms.append( np.reshape(counts, (n_pixels, 256)) )
+
+        # Find the byte containing the ranked value
+        for i in range(len(ranks)):
+            cumulative = np.cumsum(histograms[i], axis=1)
+            digit = np.argmax(cumulative > remaining[i][:, np.newaxis], axis=1)
+
+            below = np.where(digit > 0, cumulative[pixel_index, np.maximum(digit - 1, 0)], 0)
+            remaining[i] -= below
+            prefixes[i] = (prefixes[i] << 8) | digit
+
+    return [prefix - value_offset for prefix in prefixes]
+
+# ---------------------------------------------------
+# Calculate the median image of an integer array
+def _integer_median(array, block_memory=None):
+
+    # Get the ranks of the median values
+    n_frames = array.shape[0]
+    ranks = sorted( set([(n_frames - 1) // 2, n_frames // 2]) )
+
+    # Initialise the reference
+    reference_array = np.zeros(array.shape[1:], dtype=np.float64)
+
+    # Process the image by rows of pixels
+    tile_size = _get_block_size((256, *array.shape[1:]), itemsize=8, axis=1, block_memory=block_memory)
+    for rows in _get_blocks(array.shape[1], tile_size):
+        values = _select_integer_ranks(array, rows, ranks, block_memory=block_memory)
+
+        # Average the two central values
+        median = (values[0].astype(np.float64) + values[-1]) / 2
+        reference_array[rows] = np.reshape(median, reference_array[rows].shape)
+
+    return reference_array
 
 # -----------------------------
 # Calculate the reference image
-def _get_reference_image(array, type='mean'):
+def _get_reference_image(array, type='mean', signed_bits=False):
 
     # Compute the mean image
     if type.lower() == 'mean':
         reference_array = bn.nanmean(array, axis=0)
 
+    # Compute the median image of integers by counting
+    elif type.lower() == 'median' and _is_countable(array):
+        reference_array = _integer_median(array)
+
     # Compute the median image
     elif type.lower() == 'median':
         reference_array = bn.nanmedian(array, axis=0)
@@ -93,19 +332,136 @@ def _get_reference_image(array, type='mean'):
     else:
         raise Exception("Type of average ("+str(type)+") not recognized. Please pick between the given choices (mean/median).")
 
+    # Correct for signed bits
+    if signed_bits:
+        reference_array = reference_array - _get_signed_offset(array.dtype)
+
+    return reference_array
+
+# ---------------------------------------------------
+# Calculate the reference image on tiles of the array
+def _get_reference_image_tiles(array, type='mean', signed_bits=False, workers=None, tracker=None):
+
+    # Distribute the tiles over multiple processes
+    if workers is not None and workers > 1:
+        return _get_reference_image_parallel(array, type=type, signed_bits=signed_bits, workers=workers, tracker=tracker)
+
+    # Initialise the reference
+    reference_array = np.zeros(array.shape[1:], dtype=np.float64)
+
+    # Process the image by rows of pixels
+    tile_size = _get_block_size(array.shape, itemsize=8, axis=1)
+    for tile in _get_blocks(array.shape[1], tile_size):
+
+        # Load the tile in memory
+        tile_array = np.asarray(array[:, tile])
+        reference_array[tile] = _get_reference_image(tile_array, type=type, signed_bits=signed_bits)
+
+        _update_tile_progress(tracker, array, tile)
+
+    return reference_array
+
+# -----------------------------------------------------------
+# Count the rows of pixels processed in all the frames as frames
+def _update_tile_progress(tracker, array, tile):
+    if tracker is not None:
+        n_rows = tile.stop - tile.start
+        tracker.update(array.shape[0] * n_rows / array.shape[1], nbytes=array[0].nbytes * array.shape[0] * n_rows // array.shape[1])
+
+# -------------------------------------------------
+# Calculate the reference of a tile in a subprocess
+def _reference_tile_worker(arguments):
+
+    # Extract the arguments
+    source, shape, dtype, tile, type, signed_bits = arguments
+
+    # Attach the tile from the shared memory
+    shared_block = None
+    if isinstance(source, str):
+        shared_block = shared_memory.SharedMemory(name=source)
+        tile_array = np.ndarray(shape, dtype=dtype, buffer=shared_block.buf)[:, tile]
+    else:
+        tile_array = source
+
+    # Calculate the reference of the tile
+    try:
+        reference_array = _get_reference_image(tile_array, type=type, signed_bits=signed_bits)
+
+    # Release the shared memory
+    finally:
+        del tile_array
+        if shared_block is not None:
+            shared_block.close()
+
+    return tile, reference_array
+
+# ----------------------------------------------------------
+# Calculate the reference image on tiles in multiple processes
+def _get_reference_image_parallel(array, type='mean', signed_bits=False, workers=2, tracker=None):
+
+    # Initialise the reference
+    reference_array = np.zeros(array.shape[1:], dtype=np.float64)
+
+    # Split the image in tiles of rows, at least a few per worker
+    tile_size = _get_block_size(array.shape, itemsize=8, axis=1)
+    tile_size = max( min(tile_size, math.ceil(array.shape[1] / (4*workers))), 1)
+    tiles = list( _get_blocks(array.shape[1], tile_size) )
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        try:
+
+            # Send the tiles of arrays stored on the disk a few at a time
+            if isOnDisk(array):
+                for group in _get_blocks(len(tiles), 2*workers):
+                    arguments = [(np.asarray(array[:, tile]), None, None, tile, type, signed_bits) for tile in tiles[group]]
+                    for tile, tile_reference in executor.map(_reference_tile_worker, arguments):
+                        reference_array[tile] = tile_reference
+                        _update_tile_progress(tracker, array, tile)
+
+            # Share the arrays in memory with all the processes
+            else:
+                shared_block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                try:
+                    shared_array = np.ndarray(array.shape, dtype=array.dtype, buffer=shared_block.buf)
+                    shared_array[:] = array
+                    del shared_array
+
+                    arguments = [(shared_block.name, array.shape, array.dtype, tile, type, signed_bits) for tile in tiles]
+                    for tile, tile_reference in executor.map(_reference_tile_worker, arguments):
+                        reference_array[tile] = tile_reference
+                        _update_tile_progress(tracker, array, tile)
+
+                finally:
+                    shared_block.close()
+                    shared_block.unlink()
+
+        # Drop the tiles waiting for a process if the calculation failed or was cancelled
+        except BaseException:
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+
     return reference_array
 
 # ---------------------------------
 # Compute the background correction
-def _apply_correction(array, reference, type='division'):
+def _apply_correction(array, reference, type='division', offset=0, out=None):
 
-    # Compute the subtraction
+    # Get the type of the calculation
+    data_type = None
+    if out is not None:
+        data_type = out.dtype
+
+    # Compute the subtraction, with the offset included in the reference
     if type.lower() == 'subtraction':
-        corrected_array = array - reference
+        corrected_array = np.subtract(array, reference + offset, out=out, dtype=data_type)
 
-    # Compute the median image
+    # Compute the division
     elif type.lower() == 'division':
-        corrected_array = array / reference
+        if offset != 0:
+            corrected_array = np.subtract(array, offset, out=out, dtype=data_type)
+            corrected_array = np.divide(corrected_array, reference, out=corrected_array)
+        else:
+            corrected_array = np.divide(array, reference, out=out, dtype=data_type)
 
     # Raise an error
     else:
@@ -113,12 +469,612 @@ def _apply_correction(array, reference, type='division'):
 
     return corrected_array
 
+# -------------------------------------------------
+# Look for the reference image of the array in the cache
+def _lookup_reference(array, average='mean', signed_bits=False, cache=False):
+
+    # Check if the cache is used
+    cache = getReferenceCache(cache)
+    if cache is None:
+        return None, None, None
+
+    key = _get_key(getFingerprint(array), average=average, signed_bits=signed_bits)
+
+    return cache, key, cache.get(key)
+
+# ------------------------------------------------------
+# Check the reference image given by the user
+def _check_reference(array, reference):
+
+    reference = np.asarray(reference, dtype=np.float64)
+    if reference.shape != tuple(array.shape[1:]):
+        raise Exception("The shape of the reference image ("+str(reference.shape)+") should be the same as the shape of the frames ("+str(tuple(array.shape[1:]))+").")
+
+    return reference
+
+# --------------------------------------------------
+# Remove the background of the array block by block
+def _background_correction_blocks(array, reference_array, out, signed_bits=False, correction='division', rescale=True, dtype=None, tracker=None):
+
+    # Get the type used for the calculation
+    work_type = _get_work_type(array, dtype=dtype)
+    reference_array = reference_array.astype(work_type)
+
+    # Get the offset for signed bits
+    offset = 0
+    if signed_bits:
+        offset = _get_signed_offset(array.dtype)
+
+    # Calculate directly in the output array if possible
+    direct = not rescale and out.dtype == work_type
+    block_size = _get_block_size(array.shape, itemsize=work_type.itemsize)
+    if not direct:
+        buffer = np.empty((min(block_size, array.shape[0]), *array.shape[1:]), dtype=work_type)
+
+    # Correct a single block
+    def _correct_block(block):
+        if direct:
+            block_out = out[block]
+        else:
+            block_out = buffer[:block.stop - block.start]
+
+        corrected_array = _apply_correction(array[block], reference_array, type=correction, offset=offset, out=block_out)
+
+        if tracker is not None:
+            tracker.update(block.stop - block.start, nbytes=array[block].nbytes)
+
+        return corrected_array
+
+    blocks = list( _get_blocks(array.shape[0], block_size) )
+
+    # Get the scale from the maximum of the corrected array
+    if rescale:
+        max_value = max([np.amax(_correct_block(block)) for block in blocks])
+        scale = np.iinfo(array.dtype).max / max_value
+
+    # Write all the blocks in the output array
+    for block in blocks:
+        corrected_array = _correct_block(block)
+
+        if rescale:
+            np.multiply(corrected_array, scale, out=corrected_array)
+
+        if not direct:
+            out[block] = corrected_array
+
+    return out
+
+# -----------------------------------------------
+# Correct the background of a single chunk of frames
+def _correct_chunk(array, reference, correction='division', offset=0, work_type=np.float64):
+    out = np.empty(array.shape, dtype=work_type)
+    return _apply_correction(array, reference, type=correction, offset=offset, out=out)
+
+# -------------------------------------------------
+# Calculate the reference image of a dask array lazily
+def _get_dask_reference(array, average='mean', signed_bits=False):
+
+    # Average the chunks of frames for the mean
+    if average.lower() == 'mean':
+        reference_array = da.nanmean(array, axis=0, dtype=np.float64)
+        if signed_bits:
+            reference_array = reference_array - _get_signed_offset(array.dtype)
+
+    # Gather all the frames of each tile for the median
+    else:
+        tiles = array.rechunk({0:-1, 1:'auto', 2:'auto'})
+        reference_array = tiles.map_blocks(_get_reference_image, type=average, signed_bits=signed_bits, drop_axis=0, dtype=np.float64)
+
+    return reference_array
+
+# ---------------------------------------------------
+# Remove the background of a dask array, chunk by chunk
+def _background_correction_dask(array, signed_bits=False, average='mean', correction='division', rescale=True, dtype=None, reference=None):
+
+    # Use the reference given, or calculate it with the correction
+    if reference is not None:
+        reference_array = da.from_array(_check_reference(array, reference))
+    else:
+        reference_array = _get_dask_reference(array, average=average, signed_bits=signed_bits)
+
+    # Correct the chunks
+    work_type = _get_work_type(array, dtype=dtype)
+    offset = 0
+    if signed_bits:
+        offset = _get_signed_offset(array.dtype)
+
+    reference_array = reference_array.astype(work_type).rechunk(array.chunks[1:])
+    corrected_array = da.map_blocks(partial(_correct_chunk, correction=correction, offset=offset, work_type=work_type), array, reference_array[None], dtype=work_type)
+
+    # Rescale with the maximum of the corrected array
+    if rescale:
+        scale = np.iinfo(array.dtype).max / corrected_array.max()
+        corrected_array = (corrected_array * scale).astype(array.dtype)
+
+    return corrected_array
+
+# ----------------------------------------------------
+# Rescale the frames of a chunk with their own limits
+def _rescale_chunk(array, old_limits, new_limits, dtype=None, block_info=None):
+
+    # Get the position of the chunk in the stack
+    first_frame = block_info[0]['array-location'][0][0]
+
+    out = np.empty(array.shape, dtype=array.dtype)
+    for i in range(array.shape[0]):
+        _rescale_array(array[i], old_limits[first_frame + i], new_limits[first_frame + i], dtype=dtype, out=out[i])
+
+    return out
+
+# --------------------------------------------------
+# Get the frame used as reference for the drift
+def _get_drift_reference(array, reference='first', tracker=None):
+
+    # Use the given image
+    if not isinstance(reference, (str, int, np.integer)):
+        return _check_reference(array, reference)
+
+    # Use a frame of the stack
+    if isinstance(reference, (int, np.integer)):
+        return np.asarray(array[reference])
+    elif reference.lower() == 'first':
+        return np.asarray(array[0])
+
+    # Use the mean of the stack
+    elif reference.lower() == 'mean':
+        return _get_reference_image_tiles(array, type='mean', tracker=tracker)
+
+    # Raise an error
+    raise Exception("Type of reference ("+str(reference)+") not recognized. Please pick between the given choices (first/mean/previous), a frame number or an image.")
+
+# -------------------------------------------------------
+# Get the window removing the edges of the frames before the FFT
+def _get_window(shape, work_type):
+    return np.outer(np.hanning(shape[0]), np.hanning(shape[1])).astype(work_type)
+
+# ------------------------------------------------
+# Get the spectra of the frames seen through the window
+def _get_window_spectra(frames, window, conjugate=False):
+
+    # Remove the mean so the edges of the window do not correlate
+    frames = np.asarray(frames, dtype=window.dtype)
+    frames = (frames - np.mean(frames, axis=(-2, -1), keepdims=True)) * window
+    spectra = sfft.rfft2(frames)
+
+    if conjugate:
+        np.conj(spectra, out=spectra)
+
+    return spectra
+
+# ----------------------------------------------------------
+# Get the low-pass filter giving a gaussian correlation peak
+def _get_peak_filter(shape, data_type):
+
+    frequencies_y = np.fft.fftfreq(shape[0])[:, np.newaxis]
+    frequencies_x = np.fft.rfftfreq(shape[1])[np.newaxis, :]
+
+    return np.exp( -2 * np.pi**2 * _peak_width**2 * (frequencies_y**2 + frequencies_x**2) ).astype(data_type)
+
+# ----------------------------------------------------------------
+# Get the offset of the top of a gaussian through three points
+def _gaussian_offset(previous, center, next):
+
+    # Fit a parabola on the logarithm of the values
+    previous, center, next = [np.log( np.maximum(value, np.finfo(np.float64).tiny) ) for value in (previous, center, next)]
+    curvature = previous - 2 * center + next
+    offset = np.divide(previous - next, 2 * curvature, out=np.zeros(center.shape, dtype=np.float64), where=curvature < 0)
+
+    return np.clip(offset, -0.5, 0.5)
+
+# -----------------------------------------------------------------
+# Estimate the sub-pixel translations of the frames by phase correlation
+def _phase_correlation(spectra, reference_spectra, shape, peak_filter=None):
+
+    # Keep only the phase of the cross-power spectra
+    cross_power = spectra * reference_spectra
+    magnitude = np.abs(cross_power)
+    np.maximum(magnitude, np.finfo(magnitude.dtype).tiny, out=magnitude)
+    cross_power /= magnitude
+
+    # Smooth the peak into a gaussian to locate it between the pixels
+    if peak_filter is None:
+        peak_filter = _get_peak_filter(shape, magnitude.dtype)
+    cross_power *= peak_filter
+    correlation = sfft.irfft2(cross_power, s=shape)
+
+    # Find the peak of each frame
+    n_frames, height, width = correlation.shape
+    frames = np.arange(n_frames)
+    peak_y, peak_x = np.unravel_index(np.argmax(correlation.reshape(n_frames, -1), axis=1), (height, width))
+
+    # Refine the position with the neighbouring pixels, wrapped around the edges
+    center = correlation[frames, peak_y, peak_x]
+    offset_y = _gaussian_offset(correlation[frames, (peak_y - 1) % height, peak_x], center, correlation[frames, (peak_y + 1) % height, peak_x])
+    offset_x = _gaussian_offset(correlation[frames, peak_y, (peak_x - 1) % width], center, correlation[frames, peak_y, (peak_x + 1) % width])
+
+    # Convert the positions into signed shifts
+    size = np.array([height, width])
+    shifts = np.stack([peak_y + offset_y, peak_x + offset_x], axis=1)
+
+    return (shifts + size / 2) % size - size / 2
+
+# ------------------------------------------------------------
+# Move the frames back by their drift, using their spectra
+def _shift_frames(spectra, shifts, shape, fill_value=0):
+
+    # Apply separable phase ramps on the spectra
+    height, width = shape
+    spectra *= np.exp(2j * np.pi * shifts[:, 0, np.newaxis] * np.fft.fftfreq(height))[:, :, np.newaxis].astype(spectra.dtype)
+    spectra *= np.exp(2j * np.pi * shifts[:, 1, np.newaxis] * np.fft.rfftfreq(width))[:, np.newaxis, :].astype(spectra.dtype)
+
+    frames = sfft.irfft2(spectra, s=shape)
+
+    # Clear the borders wrapped around from the other side
+    for frame, (shift_y, shift_x) in zip(frames, shifts):
+        rows, columns = math.ceil(abs(shift_y)), math.ceil(abs(shift_x))
+
+        if shift_y > 0:
+            frame[height - rows:] = fill_value
+        elif shift_y < 0:
+            frame[:rows] = fill_value
+
+        if shift_x > 0:
+            frame[:, width - columns:] = fill_value
+        elif shift_x < 0:
+            frame[:, :columns] = fill_value
+
+    return frames
+
+# --------------------------------------------------
+# Convert the shifted frames into the type of the output
+def _round_frames(frames, data_type):
+
+    if issubclass(np.dtype(data_type).type, np.integer):
+        limits = np.iinfo(data_type)
+        np.rint(frames, out=frames)
+        np.clip(frames, limits.min, limits.max, out=frames)
+
+    return frames
+
+# ----------------------------------------
+# Check the drift of the frames given by the user
+def _check_shifts(array, shifts):
+
+    shifts = np.asarray(shifts, dtype=np.float64)
+    if shifts.shape != (array.shape[0], 2):
+        raise Exception("The shifts should be given as (y, x) for each frame of the stack ("+str(array.shape[0])+" frames).")
+
+    return shifts
+
+# -------------------------------------------------
+# Estimate and correct the drift of the stack by blocks
+def _drift_blocks(array, reference='first', shifts=None, out=None, fill_value=0, workers=None, dtype=None, tracker=None):
+
+    # Get the properties of the calculation
+    work_type = _get_work_type(array, dtype=dtype)
+    shape = tuple(array.shape[1:])
+    block_size = _get_block_size(array.shape, itemsize=4 * work_type.itemsize)
+
+    # Check the drift given by the user
+    if shifts is not None:
+        shifts = _check_shifts(array, shifts)
+
+    # Compare each frame with the previous one
+    running = shifts is None and isinstance(reference, str) and reference.lower() == 'previous'
+
+    # Calculate the filters and the spectrum of the reference once
+    window = _get_window(shape, work_type)
+    peak_filter = _get_peak_filter(shape, work_type)
+    reference_spectrum = None
+    if shifts is None and not running:
+        reference_array = _get_drift_reference(array, reference=reference, tracker=tracker)
+        reference_spectrum = _get_window_spectra(reference_array, window, conjugate=True)
+
+    # Process a single block of frames
+    def _process_block(block):
+
+        # Include the last frame of the previous block
+        start = block.start
+        if running and start > 0:
+            start -= 1
+
+        frames = np.asarray(array[start:block.stop], dtype=work_type)
+
+        # Get the drift of the frames
+        if shifts is not None:
+            block_shifts = shifts[block]
+        elif running:
+            spectra = _get_window_spectra(frames, window)
+            block_shifts = _phase_correlation(spectra[1:], np.conj(spectra[:-1]), shape, peak_filter=peak_filter)
+            if block.start == 0:
+                block_shifts = np.concatenate([np.zeros((1, 2)), block_shifts])
+        else:
+            block_shifts = _phase_correlation(_get_window_spectra(frames, window), reference_spectrum, shape, peak_filter=peak_filter)
+
+        # Correct the frames, without the window
+        if out is not None:
+            frames = _shift_frames(sfft.rfft2(frames[block.start - start:]), block_shifts, shape, fill_value=fill_value)
+            out[block] = _round_frames(frames, out.dtype)
+
+        return block_shifts
+
+    # Distribute the blocks over the threads
+    new_shifts = np.zeros((array.shape[0], 2))
+    for block, block_shifts in _map_blocks(_process_block, _get_blocks(array.shape[0], block_size), workers=workers):
+        new_shifts[block] = block_shifts
+
+        if tracker is not None:
+            tracker.update(block.stop - block.start, nbytes=array[0].nbytes * (block.stop - block.start))
+
+    # Add up the drifts between consecutive frames
+    if running:
+        new_shifts = np.cumsum(new_shifts, axis=0)
+
+    return new_shifts
+
+# --------------------------------------------
+# Estimate the drift of a single chunk of frames
+def _drift_chunk(array, reference_spectrum, window):
+    return _phase_correlation(_get_window_spectra(array, window), reference_spectrum, array.shape[1:])
+
+# -------------------------------------------
+# Correct the drift of a single chunk of frames
+def _shift_chunk(array, shifts, work_type=np.float64, fill_value=0, block_info=None):
+
+    # Get the position of the chunk in the stack
+    first_frame, last_frame = block_info[0]['array-location'][0]
+
+    frames = _shift_frames(sfft.rfft2( array.astype(work_type) ), shifts[first_frame:last_frame], array.shape[1:], fill_value=fill_value)
+    return _round_frames(frames, array.dtype).astype(array.dtype)
+
+# -------------------------------------------------
+# Get the spectrum of the reference of a dask array and the window
+def _get_dask_drift_reference(array, reference='first', dtype=None):
+
+    # Consecutive frames are in different chunks
+    if isinstance(reference, str) and reference.lower() == 'previous':
+        raise Exception("The drift of dask arrays can only be calculated against a fixed reference (first/mean, a frame number or an image).")
+
+    # Calculate the mean image with dask
+    if isinstance(reference, str) and reference.lower() == 'mean':
+        reference_array = da.nanmean(array, axis=0, dtype=np.float64).compute()
+    else:
+        reference_array = _get_drift_reference(array, reference=reference)
+
+    window = _get_window(array.shape[1:], _get_work_type(array, dtype=dtype))
+    return _get_window_spectra(reference_array, window, conjugate=True), window
+
+# -----------------------------------------------------
+# Calculate a statistic of all the frames of a block at once
+def _frame_statistics(frames, statistic='mean', percentile=50):
+
+    values = np.reshape(np.asarray(frames), (frames.shape[0], -1))
+
+    if statistic.lower() == 'mean':
+        return np.mean(values, axis=1, dtype=np.float64)
+    elif statistic.lower() == 'median':
+        return np.median(values, axis=1)
+    elif statistic.lower() == 'percentile':
+        return np.percentile(values, percentile, axis=1)
+
+    # Raise an error
+    raise Exception("Type of statistic ("+str(statistic)+") not recognized. Please pick between the given choices (mean/median/percentile).")
+
+# -----------------------------------------------------
+# Check the arguments of the flicker correction
+def _check_flicker_arguments(n_frames, statistic='mean', percentile=50, target='first', window=25):
+
+    # Check the statistic
+    if not isinstance(statistic, str) or statistic.lower() not in ['mean', 'median', 'percentile']:
+        raise Exception("Type of statistic ("+str(statistic)+") not recognized. Please pick between the given choices (mean/median/percentile).")
+    elif statistic.lower() == 'percentile' and not 0 <= percentile <= 100:
+        raise Exception("The percentile ("+str(percentile)+") should be between 0 and 100.")
+
+    # Check the target
+    if isinstance(target, (int, np.integer)):
+        if not -n_frames <= target < n_frames:
+            raise Exception("The target frame ("+str(target)+") should be a frame of the stack ("+str(n_frames)+" frames).")
+    elif not isinstance(target, str) or target.lower() not in ['first', 'mean', 'trend']:
+        raise Exception("Type of target ("+str(target)+") not recognized. Please pick between the given choices (first/mean/trend) or a frame number.")
+
+    # Check the size of the window
+    if not isinstance(window, (int, np.integer)) or window < 1:
+        raise Exception("The size of the window ("+str(window)+") should be a positive number of frames.")
+
+# ------------------------------------------------
+# Smooth the values of the frames on a sliding window
+def _smooth_trend(values, window=25):
+
+    # Repeat the values on the edges to keep the size
+    window = max( min(window, len(values)), 1)
+    padded_values = np.pad(values, (window // 2, window - 1 - window // 2), mode='edge')
+
+    return np.convolve(padded_values, np.ones(window) / window, mode='valid')
+
+# -------------------------------------------------
+# Get the factors bringing the frames to the target
+def _get_scale_factors(values, target='first', window=25):
+
+    # Get the value targeted by each frame
+    if isinstance(target, (int, np.integer)):
+        target_values = np.full(values.shape, values[target])
+    elif target.lower() == 'first':
+        target_values = np.full(values.shape, values[0])
+    elif target.lower() == 'mean':
+        target_values = np.full(values.shape, np.mean(values))
+    elif target.lower() == 'trend':
+        target_values = _smooth_trend(values, window=window)
+
+    # Raise an error
+    else:
+        raise Exception("Type of target ("+str(target)+") not recognized. Please pick between the given choices (first/mean/trend) or a frame number.")
+
+    # Keep the empty frames as they are
+    return np.divide(target_values, values, out=np.ones(values.shape), where=values != 0)
+
+# ---------------------------------------------
+# Scale a single chunk of frames with their factors
+def _scale_chunk(array, factors, dtype=None, block_info=None):
+
+    # Get the position of the chunk in the stack
+    first_frame, last_frame = block_info[0]['array-location'][0]
+
+    work_type = _get_work_type(array, dtype=dtype)
+    frames = np.multiply(array, factors[first_frame:last_frame, np.newaxis, np.newaxis].astype(work_type), dtype=work_type)
+
+    return _round_frames(frames, array.dtype).astype(array.dtype)
+
+# --------------------------------------------
+# Project the whole stack, block by block
+def _project_stack(array, type='max'):
+
+    projection = None
+    n_frames = 0
+
+    # Process all the blocks
+    for block in _frame_blocks(array, itemsize=8):
+        block_array = np.asarray(array[block])
+        block_frames = block_array.shape[0]
+
+        # Keep the maximum or minimum value
+        if type in ['max', 'min']:
+            if type == 'max':
+                block_projection = np.amax(block_array, axis=0)
+            else:
+                block_projection = np.amin(block_array, axis=0)
+
+            if projection is None:
+                projection = block_projection
+            elif type == 'max':
+                np.maximum(projection, block_projection, out=projection)
+            else:
+                np.minimum(projection, block_projection, out=projection)
+
+        # Sum the values
+        elif type == 'mean':
+            block_projection = np.sum(block_array, axis=0, dtype=np.float64)
+
+            if projection is None:
+                projection = block_projection
+            else:
+                projection += block_projection
+
+        # Merge the mean and squared deviations of the block (Welford / Chan)
+        else:
+            block_mean = np.mean(block_array, axis=0, dtype=np.float64)
+            block_deviation = np.sum((block_array - block_mean)**2, axis=0)
+
+            if projection is None:
+                mean, deviation = block_mean, block_deviation
+                projection = True
+            else:
+                delta = block_mean - mean
+                total_frames = n_frames + block_frames
+                mean += delta * block_frames / total_frames
+                deviation += block_deviation + delta**2 * n_frames * block_frames / total_frames
+
+        n_frames += block_frames
+
+    # Finish the calculation
+    if type == 'mean':
+        projection /= n_frames
+    elif type == 'std':
+        projection = np.sqrt(deviation / n_frames)
+
+    return projection
+
+# -----------------------------------------------------
+# Project the stack on sliding windows of mean or std
+def _project_windows_moments(array, type='mean', window=10):
+
+    # Initialise the output
+    n_windows = array.shape[0] - window + 1
+    projection = np.empty((n_windows, *array.shape[1:]), dtype=np.float64)
+
+    # Calculate the first window
+    first_window = np.asarray(array[0:window], dtype=np.float64)
+    mean = np.mean(first_window, axis=0)
+    deviation = np.sum((first_window - mean)**2, axis=0)
+    del first_window
+
+    # Slide the window one frame at a time
+    for i in range(n_windows):
+
+        # Replace the oldest frame by the new one
+        if i > 0:
+            old_frame = np.asarray(array[i - 1], dtype=np.float64)
+            new_frame = np.asarray(array[i + window - 1], dtype=np.float64)
+
+            delta = new_frame - old_frame
+            new_mean = mean + delta / window
+            deviation += delta * (new_frame - new_mean + old_frame - mean)
+            np.maximum(deviation, 0, out=deviation)
+            mean = new_mean
+
+        # Save the value
+        if type == 'mean':
+            projection[i] = mean
+        else:
+            projection[i] = np.sqrt(deviation / window)
+
+    return projection
+
+# --------------------------------------------------------
+# Project the stack on sliding windows of max or min (van Herk)
+def _project_windows_extrema(array, type='max', window=10):
+
+    # Initialise the output
+    n_frames = array.shape[0]
+    n_windows = n_frames - window + 1
+    projection = np.empty((n_windows, *array.shape[1:]), dtype=array.dtype)
+
+    if type == 'max':
+        operation = np.maximum
+    else:
+        operation = np.minimum
+
+    # Process the stack by chunks of the size of the window
+    previous_suffix = None
+    for start in range(0, n_frames + window, window):
+        chunk = np.asarray(array[start:start + window])
+
+        # Get the cumulative extrema from both ends of the chunk
+        if chunk.shape[0] > 0:
+            prefix = operation.accumulate(chunk, axis=0)
+            suffix = operation.accumulate(chunk[::-1], axis=0)[::-1]
+        else:
+            prefix, suffix = None, None
+
+        # Combine with the previous chunk for the windows starting in it
+        if previous_suffix is not None:
+            previous_start = start - window
+            n_starting = min(window, n_windows - previous_start)
+
+            if n_starting > 0:
+                projection[previous_start] = previous_suffix[0]
+                if n_starting > 1:
+                    operation(previous_suffix[1:n_starting], prefix[:n_starting - 1], out=projection[previous_start + 1:previous_start + n_starting])
+
+        if suffix is None or start >= n_windows:
+            break
+
+        previous_suffix = suffix
+
+    return projection
+
 # ---------------------------------------------------
 # Display the PV distribution and the user set limits
-def _display_distribution(array, min, max, n_bins=1000, log_scale=None):
+def _display_distribution(array, min, max, n_bins=1000, log_scale=None, histogram=None):
 
-    # Display the histogram
-    plt.hist(np.ravel(array), bins=n_bins)
+    # Display the histogram from the pixel counts
+    if histogram is not None:
+        counts, first_value = histogram
+        filled_bins = np.nonzero(counts)[0]
+        plt.hist(filled_bins + first_value, bins=n_bins, weights=counts[filled_bins])
+
+    # Display the histogram from the pixel values
+    else:
+        plt.hist(np.ravel(array), bins=n_bins)
 
     # Add the limit bar
     plt.axvline(x=min, color='blue', alpha=.5)
@@ -137,57 +1093,360 @@ def _display_distribution(array, min, max, n_bins=1000, log_scale=None):
 
     plt.show()
 
+##-\-\-\-\-\-\-\-\-\-\
+## RUNNING REFERENCE CLASS
+##-/-/-/-/-/-/-/-/-/-/-/-/
+
+# ---------------------------------------------------------
+# Class to update the background reference frame by frame
+class RunningReference:
+    def __init__(self, type='mean', signed_bits=False):
+
+        # Check the type of average
+        if type.lower() not in ['mean', 'median']:
+            raise Exception("Type of average ("+str(type)+") not recognized. Please pick between the given choices (mean/median).")
+
+        self.type = type.lower()
+        self.signed_bits = signed_bits
+        self.n_frames = 0
+
+        # Initialise the running values
+        self._reference = None
+        self._deviation = None
+        self._offset = 0
+
+    # ---------------------------------------
+    # Add a new frame to the reference image
+    def update(self, frame):
+
+        # Convert the frame
+        if self.signed_bits:
+            self._offset = _get_signed_offset(frame.dtype)
+        frame = np.asarray(frame, dtype=np.float64) - self._offset
+        self.n_frames += 1
+
+        # Initialise with the first frame
+        if self._reference is None:
+            self._reference = np.copy(frame)
+            self._deviation = np.zeros(frame.shape, dtype=np.float64)
+
+        # Update the mean
+        elif self.type == 'mean':
+            self._reference += (frame - self._reference) / self.n_frames
+
+        # Move the median estimate towards the new value, by steps scaled on the mean deviation
+        else:
+            difference = frame - self._reference
+            self._deviation += (np.abs(difference) - self._deviation) / self.n_frames
+            self._reference += np.sign(difference) * self._deviation / self.n_frames
+
+    # -----------------------------------
+    # Get the current reference image
+    def reference(self):
+        return np.copy(self._reference)
+
+    # --------------------------------------------------
+    # Correct the background of a frame with the reference
+    def correct(self, frame, correction='division'):
+        return _apply_correction(frame, self._reference, type=correction, offset=self._offset)
+
 ##-\-\-\-\-\-\-\-\
 ## PUBLIC FUNCTIONS
 ##-/-/-/-/-/-/-/-/
 
 # --------------------------------------------
 # Prepare the contrast correction of the image
-def setContrastCorrection(array, min=None, max=None, percentile=10, percentile_min=None, rescale=True):
+def setContrastCorrection(array, min=None, max=None, percentile=10, percentile_min=None, rescale=True, histogram=None):
+
+    # Count the values of dask arrays once for all the limits
+    if histogram is None and isDask(array) and _is_countable(array):
+        histogram = _get_histogram(array)
 
     # Get the limits for the old values
-    min, max = _get_min_max(array, min=min, max=max, percentile=percentile, percentile_min=percentile_min)
+    min, max = _get_min_max(array, min=min, max=max, percentile=percentile, percentile_min=percentile_min, histogram=histogram)
 
     # Get the limits in new values
-    new_min, new_max = _get_scale(array, rescale=rescale)
+    new_min, new_max = _get_scale(array, rescale=rescale, histogram=histogram)
+
+    # Calculate the limits of dask arrays
+    if isDask(array):
+        min, max, new_min, new_max = dask.compute(min, max, new_min, new_max)
 
     return (min, max), (new_min, new_max)
 
 # -----------------
 # Rescale the array
-def doContrastCorrection(array, old_limits, new_limits):
-    return _rescale_array(array, old_limits, new_limits)
+def doContrastCorrection(array, old_limits, new_limits, dtype=None, out=None):
+
+    # Rescale the chunks of dask arrays
+    if isDask(array):
+        return array.map_blocks(partial(_rescale_array, old_limits=old_limits, new_limits=new_limits, dtype=dtype), dtype=array.dtype)
+
+    return _rescale_array(array, old_limits, new_limits, dtype=dtype, out=out)
+
+# ----------------------------------------------------
+# Rescale a large image tile by tile, in parallel
+def doTiledContrastCorrection(array, old_limits, new_limits, dtype=None, out=None, tile_size=None, workers=None):
+
+    # Initialise the output array
+    if out is None:
+        out = np.empty(array.shape, dtype=array.dtype)
+
+    # Use the precision of the whole image on all the tiles
+    work_type = _get_work_type(array, dtype=dtype)
+
+    # Rescale a single tile, on all the frames
+    def _correct_tile(tile):
+        tile = (Ellipsis, *tile)
+        _rescale_array(array[tile], old_limits, new_limits, dtype=work_type, out=out[tile])
+
+    # Distribute the tiles over the threads
+    for _ in _map_tiles(_correct_tile, array.shape[-2:], tile_size=tile_size, workers=workers):
+        pass
+
+    return out
+
+# --------------------------------------------------------
+# Rescale all the frames of the stack in parallel blocks
+def doStackContrastCorrection(array, old_limits, new_limits, out=None, workers=None, dtype=None):
+
+    # Check if the limits are given for each frame
+    per_frame = len(np.shape(old_limits)) == 2
+
+    # Rescale the chunks of dask arrays
+    if isDask(array):
+        if per_frame:
+            return array.map_blocks(partial(_rescale_chunk, old_limits=old_limits, new_limits=new_limits, dtype=dtype), dtype=array.dtype)
+
+        return doContrastCorrection(array, old_limits, new_limits, dtype=dtype)
+
+    # Split single frames in tiles to use all the threads
+    if array.shape[0] == 1:
+        if per_frame:
+            old_limits, new_limits = old_limits[0], new_limits[0]
+        return doTiledContrastCorrection(array, old_limits, new_limits, dtype=dtype, out=out, workers=workers)
+
+    # Initialise the output array
+    if out is None:
+        out = np.empty(array.shape, dtype=array.dtype)
+
+    # Rescale a single block of frames
+    def _correct_block(block):
+        if per_frame:
+            for i in range(block.start, block.stop):
+                _rescale_array(array[i], old_limits[i], new_limits[i], dtype=dtype, out=out[i])
+        else:
+            _rescale_array(array[block], old_limits, new_limits, dtype=dtype, out=out[block])
+
+    # Distribute the blocks over the threads
+    work_type = _get_work_type(array, dtype=dtype)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list( executor.map(_correct_block, _frame_blocks(array, itemsize=work_type.itemsize)) )
+
+    return out
+
+# ------------------------------------------------------
+# Calculate the background reference image of a stack
+def getReferenceImage(array, average='mean', signed_bits=False, workers=None, cache=False, progress=None):
+
+    # Look for the reference in the cache
+    cache, key, reference_array = _lookup_reference(array, average=average, signed_bits=signed_bits, cache=cache)
+    if reference_array is not None:
+        return reference_array
+
+    # Calculate the reference
+    if isDask(array):
+        reference_array = _get_dask_reference(array, average=average, signed_bits=signed_bits).compute()
+    else:
+        tracker = Progress(progress, 'getReferenceImage', array.shape[0])
+        reference_array = _get_reference_image_tiles(array, type=average, signed_bits=signed_bits, workers=workers, tracker=tracker)
+
+    # Keep the reference for the next corrections
+    if cache is not None:
+        reference_array = cache.put(key, reference_array)
+
+    return reference_array
 
 # ---------------------------------------
 # Remove the background of an image stack
-def backgroundCorrection(array, signed_bits=False, average='mean', correction='division', rescale=True):
+def backgroundCorrection(array, signed_bits=False, average='mean', correction='division', rescale=True, out=None, workers=None, dtype=None, progress=None, reference=None, cache=False):
 
-    # Save the type of the array
-    data_type = array.dtype
+    # Process dask arrays chunk by chunk
+    if isDask(array):
+        if reference is None and cache:
+            reference = getReferenceImage(array, average=average, signed_bits=signed_bits, cache=cache)
 
-    # Correct for signed bits
-    if signed_bits:
-        array = _correct_signed_bits(array)
+        return _background_correction_dask(array, signed_bits=signed_bits, average=average, correction=correction, rescale=rescale, dtype=dtype, reference=reference)
+
+    # Use the reference given or the one in the cache
+    if reference is not None:
+        cache, reference_array = None, _check_reference(array, reference)
+    else:
+        cache, key, reference_array = _lookup_reference(array, average=average, signed_bits=signed_bits, cache=cache)
+
+    # Count the frames of each pass on the stack: reference, maximum and correction
+    n_passes = 2 if rescale else 1
+    if reference_array is None:
+        n_passes += 1
+    tracker = Progress(progress, 'backgroundCorrection', n_passes * array.shape[0])
 
     # Calculate the background reference
-    reference_array = _get_reference_image(array, type=average)
+    if reference_array is None:
+        reference_array = _get_reference_image_tiles(array, type=average, signed_bits=signed_bits, workers=workers, tracker=tracker)
+
+        if cache is not None:
+            cache.put(key, reference_array)
+
+    # Initialise the output array
+    if out is None:
+        if rescale:
+            out = np.empty(array.shape, dtype=array.dtype)
+        else:
+            out = np.empty(array.shape, dtype=_get_work_type(array, dtype=dtype))
 
     # Correct the background
-    corrected_array = _apply_correction(array, reference_array, type=correction)
+    return _background_correction_blocks(array, reference_array, out, signed_bits=signed_bits, correction=correction, rescale=rescale, dtype=dtype, tracker=tracker)
 
-    # Rescale the array
-    if rescale:
-        corrected_array = corrected_array * np.iinfo(data_type).max / np.amax(corrected_array)
-        corrected_array = corrected_array.astype(data_type)
+# ------------------------------------------------------
+# Estimate the translation of each frame of the stack
+def estimateDrift(array, reference='first', workers=None, dtype=None, progress=None):
 
-    return corrected_array
+    # Estimate the drift of all the frames of the chunks
+    if isDask(array):
+        reference_spectrum, window = _get_dask_drift_reference(array, reference=reference, dtype=dtype)
+        frames = array.rechunk({1:-1, 2:-1})
+        return frames.map_blocks(_drift_chunk, reference_spectrum, window, drop_axis=2, chunks=(frames.chunks[0], (2,)), dtype=np.float64).compute()
+
+    # Count the frames of each pass: mean reference and estimation
+    n_passes = 2 if isinstance(reference, str) and reference.lower() == 'mean' else 1
+    tracker = Progress(progress, 'estimateDrift', n_passes * array.shape[0])
+
+    return _drift_blocks(array, reference=reference, workers=workers, dtype=dtype, tracker=tracker)
+
+# ------------------------------------
+# Remove the drift of the stack frames
+def driftCorrection(array, reference='first', shifts=None, fill_value=0, out=None, workers=None, dtype=None, progress=None, return_shifts=False):
+
+    # Correct the chunks of dask arrays
+    if isDask(array):
+
+        # Dask arrays are never written in place
+        if out is not None:
+            raise Exception("The drift of dask arrays cannot be corrected in an output array. Please use the dask array returned instead.")
+
+        # Estimate the drift once, or use the one given
+        frames = array.rechunk({1:-1, 2:-1})
+        if shifts is None:
+            shifts = estimateDrift(frames, reference=reference, dtype=dtype)
+        else:
+            shifts = _check_shifts(array, shifts)
+
+        corrected_array = frames.map_blocks(_shift_chunk, shifts, work_type=_get_work_type(array, dtype=dtype), fill_value=fill_value, dtype=array.dtype)
+
+        if return_shifts:
+            return corrected_array, shifts
+
+        return corrected_array
+
+    # Initialise the output array
+    if out is None:
+        out = np.empty(array.shape, dtype=array.dtype)
+
+    # Count the frames of each pass: mean reference, estimation and correction
+    running = shifts is None and isinstance(reference, str) and reference.lower() == 'previous'
+    n_passes = 2 if running or (shifts is None and isinstance(reference, str) and reference.lower() == 'mean') else 1
+    tracker = Progress(progress, 'driftCorrection', n_passes * array.shape[0])
+
+    # Add up the drift between consecutive frames before correcting them
+    if running:
+        shifts = _drift_blocks(array, reference=reference, workers=workers, dtype=dtype, tracker=tracker)
+
+    # Correct the frames in the same pass as the estimation
+    shifts = _drift_blocks(array, reference=reference, shifts=shifts, out=out, fill_value=fill_value, workers=workers, dtype=dtype, tracker=tracker)
+
+    if return_shifts:
+        return out, shifts
+
+    return out
+
+# ------------------------------------------------------
+# Correct the changes of intensity between the frames
+def flickerCorrection(array, statistic='mean', percentile=50, target='first', window=25, out=None, workers=None, dtype=None, progress=None):
+
+    # Check the arguments before reading the stack
+    _check_flicker_arguments(array.shape[0], statistic=statistic, percentile=percentile, target=target, window=window)
+
+    # Process the full frames of dask arrays
+    if isDask(array):
+        frames = array.rechunk({1:-1, 2:-1})
+        values = frames.map_blocks(_frame_statistics, statistic=statistic, percentile=percentile, drop_axis=[1, 2], dtype=np.float64).compute()
+        factors = _get_scale_factors(values, target=target, window=window)
+
+        return frames.map_blocks(_scale_chunk, factors, dtype=array.dtype)
+
+    # Count the frames of each pass: statistics and correction
+    tracker = Progress(progress, 'flickerCorrection', 2 * array.shape[0])
+    work_type = _get_work_type(array, dtype=dtype)
+
+    # Calculate the statistics of blocks of frames in parallel
+    values = np.empty(array.shape[0])
+    for block, block_values in _map_blocks(lambda block: _frame_statistics(array[block], statistic=statistic, percentile=percentile), _frame_blocks(array, itemsize=8), workers=workers):
+        values[block] = block_values
+        tracker.update(block.stop - block.start, nbytes=array[0].nbytes * (block.stop - block.start))
+
+    factors = _get_scale_factors(values, target=target, window=window).astype(work_type)
+
+    # Initialise the output array
+    if out is None:
+        out = np.empty(array.shape, dtype=array.dtype)
+
+    # Scale a single block of frames, directly in the output if possible
+    def _scale_block(block):
+        if out.dtype == work_type:
+            np.multiply(array[block], factors[block, np.newaxis, np.newaxis], out=out[block])
+        else:
+            frames = np.multiply(array[block], factors[block, np.newaxis, np.newaxis], dtype=work_type)
+            out[block] = _round_frames(frames, out.dtype)
+
+    for block, _ in _map_blocks(_scale_block, _frame_blocks(array, itemsize=work_type.itemsize), workers=workers):
+        tracker.update(block.stop - block.start, nbytes=array[0].nbytes * (block.stop - block.start))
+
+    return out
+
+# ------------------------------------------
+# Compute a temporal projection of the stack
+def temporalProjection(array, type='max', window=None):
+
+    # Check the type of projection
+    type = type.lower()
+    if type not in ['max', 'min', 'mean', 'std']:
+        raise Exception("Type of projection ("+str(type)+") not recognized. Please pick between the given choices (max/min/mean/std).")
+
+    # Project the whole stack
+    if window is None:
+
+        # Use the reductions of dask
+        if isDask(array):
+            return getattr(array, type)(axis=0)
+
+        return _project_stack(array, type=type)
+
+    # Check the size of the window
+    if window < 1 or window > array.shape[0]:
+        raise Exception("The size of the window ("+str(window)+") should be between 1 and the number of frames ("+str(array.shape[0])+").")
+
+    # Project on sliding windows
+    if type in ['max', 'min']:
+        return _project_windows_extrema(array, type=type, window=window)
+
+    return _project_windows_moments(array, type=type, window=window)
 
 # ---------------------------------
 # Show the pixel value distribution
-def showPVDistribution(array, n_bins=1000, min=None, max=None, percentile=10, percentile_min=None, log_scale=None):
+def showPVDistribution(array, n_bins=1000, min=None, max=None, percentile=10, percentile_min=None, log_scale=None, histogram=None):
 
     # Get the limits for the current values
-    min, max = _get_min_max(array, min=min, max=max, percentile=percentile, percentile_min=percentile_min)
+    min, max = _get_min_max(array, min=min, max=max, percentile=percentile, percentile_min=percentile_min, histogram=histogram)
 
     # Display the histogram
-    _display_distribution(array, min, max, n_bins=n_bins, log_scale=log_scale)
+    _display_distribution(array, min, max, n_bins=n_bins, log_scale=log_scale, histogram=histogram)
@@ -0,0 +1,117 @@
+import threading
+
+##-\-\-\-\-\-\
+## CACHE CLASS
+##-/-/-/-/-/-/
+
+# -----------------------------------------------------------
+# Class to keep the frames around the current one in memory
+class FrameCache:
+    def __init__(self, load_frame, n_frames, n_prefetch=4):
+
+        # Function used to read and correct a frame
+        self.load_frame = load_frame
+        self.n_frames = n_frames
+
+        # Number of frames prefetched on each side of the current one
+        self.n_prefetch = n_prefetch
+        self.max_size = 2 * n_prefetch + 1
+
+        # Initialise the cache
+        self._frames = {}
+        self._center = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+
+    # -------------------------------------------------
+    # Get the list of frames to prefetch, closest first
+    def _get_wanted_frames(self):
+
+        wanted_frames = []
+        for distance in range(1, self.n_prefetch + 1):
+            for number in [self._center + distance, self._center - distance]:
+                if 0 <= number < self.n_frames:
+                    wanted_frames.append(number)
+
+        return wanted_frames
+
+    # ----------------------------------------------
+    # Remove the frames furthest from the current one
+    def _evict_frames(self):
+
+        while len(self._frames) > self.max_size:
+            furthest = max(self._frames, key=lambda number: abs(number - self._center))
+            del self._frames[furthest]
+
+    # ------------------------------------------
+    # Load the missing frames in the background
+    def _prefetch_frames(self):
+
+        while True:
+
+            # Select the closest missing frame
+            with self._lock:
+                missing_frames = [number for number in self._get_wanted_frames() if number not in self._frames]
+
+                if self._closed or len(missing_frames) == 0:
+                    self._thread = None
+                    return
+
+                number = missing_frames[0]
+
+            # Read the frame outside of the lock
+            frame = self.load_frame(number)
+
+            # Keep it if it is still close to the current frame
+            with self._lock:
+                if abs(number - self._center) <= self.n_prefetch:
+                    self._frames[number] = frame
+                    self._evict_frames()
+
+    # ---------------------------------
+    # Start the prefetching if required
+    def _start_prefetch(self):
+
+        with self._lock:
+            if self._closed or self.n_prefetch == 0 or self._thread is not None:
+                return
+
+            self._thread = threading.Thread(target=self._prefetch_frames, daemon=True)
+            self._thread.start()
+
+    # -------------------------------------------------
+    # Get a frame and prefetch the surrounding ones
+    def get(self, number):
+
+        # Look for the frame in the cache
+        with self._lock:
+            self._center = number
+            frame = self._frames.get(number)
+
+        # Load the frame if missing
+        if frame is None:
+            frame = self.load_frame(number)
+
+            with self._lock:
+                self._frames[number] = frame
+                self._evict_frames()
+
+        # Prefetch the next and previous frames
+        self._start_prefetch()
+
+        return frame
+
+    # ---------------------------
+    # Check if a frame is in cache
+    def isCached(self, number):
+        with self._lock:
+            return number in self._frames
+
+    # ------------------------------
+    # Stop the prefetching thread
+    def close(self):
+
+        with self._lock:
+            self._closed = True
+            self._frames = {}
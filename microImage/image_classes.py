@@ -1,12 +1,22 @@
 from copy import deepcopy
-import matplotlib.pyplot as plt
+from multiprocessing import shared_memory
 import numpy as np
 import os
+import weakref
 
-from microImage.correction import backgroundCorrection, setContrastCorrection, doContrastCorrection, showPVDistribution
-from microImage.input_output import saveImage, saveVideo
+from microImage.correction import RunningReference, backgroundCorrection, driftCorrection, flickerCorrection, setContrastCorrection, doContrastCorrection, doStackContrastCorrection, showPVDistribution, temporalProjection, _get_histogram, _is_countable
+from microImage.frame_cache import FrameCache
+from microImage.input_output import saveImage, saveVideo, watchFolder
 from microImage.labelling import timeStamps, scaleBar, makeMontage
-from microImage.modification import crop
+from microImage.lazy_import import lazyImport
+from microImage.modification import binning, crop, _get_bin_sizes, _get_bin_types
+from microImage.progress import OperationCancelled
+from microImage.session import readSession, writeSession
+from microImage.storage import copyToScratch, isDask, isOnDisk, scratchArray, _frame_blocks
+from microImage.viewer import StackViewer
+
+# Heavy dependencies, loaded on first use
+plt = lazyImport('matplotlib.pyplot')
 
 ##-\-\-\-\-\-\-\-\
 ## PRIVATE FUNCTION
@@ -33,6 +43,42 @@ def _get_saved_name(name, frame_number=None):
 
     return name + '_saved'
 
+# -------------------------------------------------------
+# Get the attributes of the stack, without the arrays and caches
+def _get_stack_attributes(stack):
+
+    attributes = stack.__getstate__()
+    for key in ['source', 'array', 'frame', '_frame_cache', '_storage', '_frame_histograms', '_stack_histogram', '_merged_frames', 'running_reference']:
+        attributes.pop(key, None)
+
+    # Keep the contrast correction of the displayed frame
+    frame_attributes = {key:value for key, value in stack.frame.__dict__.items() if key not in ['raw', 'corrected']}
+
+    return attributes, frame_attributes
+
+# ---------------------------------------------------
+# Rebuild a stack from its attributes and its arrays
+def _restore_stack(attributes, frame_attributes, source, array):
+
+    # Initialise the stack with the saved attributes
+    stack = ImageStack.__new__(ImageStack)
+    stack.__dict__.update(attributes)
+    stack.source, stack.array = source, array
+
+    # Reload the frame with its contrast correction
+    stack.frame = ImageFrame(stack.array[stack.frame_nbr])
+    stack.frame.__dict__.update(frame_attributes)
+    if stack.frame._isCorrected:
+        stack.frame.contrastCorrection()
+
+    # Initialize the caches
+    stack._frame_cache = None
+    stack._clear_cache()
+    stack._storage = {}
+    stack.running_reference = None
+
+    return stack
+
 ##-\-\-\-\-\-\
 ## IMAGE CLASS
 ##-/-/-/-/-/-/
@@ -42,8 +88,8 @@ def _get_saved_name(name, frame_number=None):
 class ImageFrame:
     def __init__(self, array):
 
-        self.raw = array
-        self.corrected = np.copy(array)
+        self.raw = np.asarray(array)
+        self.corrected = np.copy(self.raw)
 
         # Initialize limits for contrast correction
         self._isCorrected = False
@@ -55,13 +101,19 @@ class ImageFrame:
     def updateFrame(self, array):
 
         # Update the attributes
-        self.raw = array
-        self.corrected = np.copy(array)
+        self.raw = np.asarray(array)
+        self.corrected = np.copy(self.raw)
 
         # Apply correction if possible
         if self._isCorrected:
             self.contrastCorrection()
 
+    # ---------------------------------------------
+    # Load a frame that has already been corrected
+    def loadFrame(self, raw, corrected):
+        self.raw = raw
+        self.corrected = corrected
+
     # ---------------------------------
     # Correct the contrast on the image
     def contrastCorrection(self):
@@ -74,13 +126,29 @@ class ImageFrame:
 # ------------------------------------
 # Class to handle a multi-frame object
 class ImageStack:
-    def __init__(self, array, name='Untitled'):
+    def __init__(self, array, name='Untitled', out_of_core=False, scratch_dir=None):
 
         # Extract the informations
         self.name = name
 
-        self.source = array
-        self.array = np.copy(array)
+        # Keep the arrays on disk
+        self.out_of_core = out_of_core
+        self.scratch_dir = scratch_dir
+        if self.out_of_core:
+            if not isOnDisk(array):
+                array = copyToScratch(array, scratch_dir=self.scratch_dir)
+            self.source = array
+            self.array = copyToScratch(array, scratch_dir=self.scratch_dir)
+
+        # Keep the dask arrays lazy, they are never modified in place
+        elif isDask(array):
+            self.source = array
+            self.array = array
+
+        # Keep the arrays in memory
+        else:
+            self.source = array
+            self.array = np.copy(array)
 
         self.n_frames = array.shape[0]
         self.size = array.shape[1:]
@@ -89,28 +157,243 @@ class ImageStack:
         self.frame = ImageFrame(self.array[0])
         self.frame_nbr = 0
 
+        # Initialize the caches
+        self.n_prefetch = 4 # Frames loaded in advance on each side
+        self._frame_cache = None
+        self._clear_cache()
+
+        # Initialize the storage of appended frames
+        self._storage = {}
+        self.running_reference = None
+
         # Initialize the calibration
         self.space_unit = 'px'
         self.space_scale = 1 # In unit/pixel
         self.time_unit = 'frame'
         self.time_scale = 1 # In unit/frame
 
+    ##-\-\-\-\-\-\-\-\-\-\
+    ## PIXEL VALUE HISTOGRAMS
+    ##-/-/-/-/-/-/-/-/-/-/-/
+
+    # ---------------------------------------------------
+    # Remove the frames and histograms of the old array
+    def _clear_cache(self):
+        self._clear_frame_cache()
+        self._frame_histograms = {}
+        self._stack_histogram = None
+        self._merged_frames = set()
+
+    # -------------------------------------
+    # Remove the prefetched frames
+    def _clear_frame_cache(self):
+        if self._frame_cache is not None:
+            self._frame_cache.close()
+            self._frame_cache = None
+
+    # ------------------------------------------------
+    # Get the cache used to load and prefetch frames
+    def _get_frame_cache(self):
+
+        # Initialise the cache with the current array and contrast limits
+        if self._frame_cache is None:
+            array = self.array
+
+            limits = None
+            if self.frame._isCorrected:
+                limits = (self.frame._min_to_correct, self.frame._max_to_correct), (self.frame._min_corrected, self.frame._max_corrected)
+
+            # Read and correct a single frame
+            def _load_frame(number):
+                raw = np.array(array[number])
+                if limits is None:
+                    corrected = np.copy(raw)
+                else:
+                    corrected = doContrastCorrection(raw, *limits)
+
+                return raw, corrected
+
+            self._frame_cache = FrameCache(_load_frame, array.shape[0], n_prefetch=self.n_prefetch)
+
+        return self._frame_cache
+
+    # -----------------------------------
+    # Do not copy the threads and caches
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_frame_cache'] = None
+        state['_storage'] = {}
+        return state
+
+    # -------------------------------------------------------
+    # Add frames at the end of an array, with spare capacity
+    def _extend_array(self, key, array, new_frames):
+
+        n_frames = array.shape[0] + new_frames.shape[0]
+
+        # Reuse the storage if the array has not been replaced since
+        storage, view = self._storage.get(key, (None, None))
+
+        # Allocate a storage twice larger
+        if view is not array or storage.shape[0] < n_frames:
+            capacity = max(n_frames, 2 * array.shape[0])
+            if self.out_of_core:
+                storage = scratchArray((capacity, *array.shape[1:]), array.dtype, scratch_dir=self.scratch_dir)
+            else:
+                storage = np.empty((capacity, *array.shape[1:]), dtype=array.dtype)
+
+            for block in _frame_blocks(array):
+                storage[block] = array[block]
+
+        # Add the new frames
+        storage[array.shape[0]:n_frames] = new_frames
+        view = storage[:n_frames]
+        self._storage[key] = (storage, view)
+
+        return view
+
+    # --------------------------------------------------------
+    # Get an empty array like the given one, on disk for out-of-core stacks
+    def _empty_like(self, array):
+        if self.out_of_core:
+            return scratchArray(array.shape, array.dtype, scratch_dir=self.scratch_dir)
+
+        return np.empty(array.shape, dtype=array.dtype)
+
+    # ------------------------------------------------------------------
+    # Copy the arrays mapped from a session to the scratch folder before writing in them
+    def _copy_mapped_arrays(self):
+
+        # The pages modified in copy-on-write maps stay in memory
+        if self.out_of_core:
+            if isOnDisk(self.source) and self.source.mode == 'c':
+                self.source = copyToScratch(self.source, scratch_dir=self.scratch_dir)
+            if isOnDisk(self.array) and self.array.mode == 'c':
+                self.array = copyToScratch(self.array, scratch_dir=self.scratch_dir)
+
+    # -------------------------------------------
+    # Get the pixel value histogram of a frame
+    def frameHistogram(self, number=None):
+
+        # Histograms are only computed for 8 and 16 bits integers
+        if not _is_countable(self.array):
+            return None
+
+        # Select the current frame
+        if number is None:
+            number = self.frame_nbr
+
+        # Count the values if not in the memory
+        if number not in self._frame_histograms:
+            self._frame_histograms[number] = _get_histogram(self.array[number])
+
+        return self._frame_histograms[number]
+
+    # ------------------------------------------------
+    # Get the pixel value histogram of the whole stack
+    def stackHistogram(self):
+
+        # Histograms are only computed for 8 and 16 bits integers
+        if not _is_countable(self.array):
+            return None
+
+        # Count dask arrays at once, chunk by chunk
+        if isDask(self.array) and self._stack_histogram is None:
+            self._stack_histogram = _get_histogram(self.array)
+            self._merged_frames = set(range(self.array.shape[0]))
+
+        # Merge the frames that have not been counted yet
+        for number in range(self.array.shape[0]):
+            if number not in self._merged_frames:
+
+                # Reuse the histogram of the frame if available
+                if number in self._frame_histograms:
+                    counts, first_value = self._frame_histograms[number]
+                else:
+                    counts, first_value = _get_histogram(self.array[number])
+
+                # Add the counts to the stack
+                if self._stack_histogram is None:
+                    self._stack_histogram = (counts.copy(), first_value)
+                else:
+                    self._stack_histogram[0][:] += counts
+
+                self._merged_frames.add(number)
+
+        return self._stack_histogram
+
     ##-\-\-\-\-\-\-\-\
     ## IMAGE CORRECTION
     ##-/-/-/-/-/-/-/-/
 
     # -----------------------------------------
     # Correct the background of the image array
-    def backgroundCorrection(self, signed_bits=False, average='mean', correction='division'):
+    def backgroundCorrection(self, signed_bits=False, average='mean', correction='division', workers=None, dtype=None, progress=None, reference=None, cache=False):
 
         # Check if it's a sequence
         _check_multiple_frames(self.source)
 
         # Apply the correction
-        self.array = backgroundCorrection(self.source, signed_bits=signed_bits, average=average, correction=correction)
+        if self.out_of_core:
+            self._copy_mapped_arrays()
+            try:
+                backgroundCorrection(self.source, signed_bits=signed_bits, average=average, correction=correction, out=self.array, workers=workers, dtype=dtype, progress=progress, reference=reference, cache=cache)
+
+            # Do not keep a partially corrected array
+            except OperationCancelled:
+                self.reset()
+                raise
+
+        else:
+            self.array = backgroundCorrection(self.source, signed_bits=signed_bits, average=average, correction=correction, workers=workers, dtype=dtype, progress=progress, reference=reference, cache=cache)
 
         # Update the displayed frame
         self.frame.updateFrame( self.array[self.frame_nbr] )
+        self._clear_cache()
+
+    # -------------------------------------------
+    # Remove the drift of the stage from all the arrays
+    def driftCorrection(self, reference='first', fill_value=0, workers=None, dtype=None, progress=None):
+
+        # Check if it's a sequence
+        _check_multiple_frames(self.source)
+
+        # Register the frames of dask arrays lazily, with the drift of the source
+        if isDask(self.source):
+            source, shifts = driftCorrection(self.source, reference=reference, fill_value=fill_value, dtype=dtype, return_shifts=True)
+            array = driftCorrection(self.array, shifts=shifts, fill_value=fill_value, dtype=dtype)
+
+        # Register both arrays in new arrays, to keep the old ones if cancelled
+        else:
+            source, shifts = driftCorrection(self.source, reference=reference, fill_value=fill_value, out=self._empty_like(self.source), workers=workers, dtype=dtype, progress=progress, return_shifts=True)
+            array = driftCorrection(self.array, shifts=shifts, fill_value=fill_value, out=self._empty_like(self.array), workers=workers, dtype=dtype, progress=progress)
+
+        self.source, self.array = source, array
+
+        # Update the displayed frame
+        self.frame.updateFrame( self.array[self.frame_nbr] )
+        self._clear_cache()
+
+        return shifts
+
+    # --------------------------------------------------
+    # Correct the changes of intensity between the frames
+    def flickerCorrection(self, statistic='mean', percentile=50, target='first', window=25, workers=None, dtype=None, progress=None):
+
+        # Check if it's a sequence
+        _check_multiple_frames(self.array)
+
+        # Scale the frames of dask arrays lazily
+        if isDask(self.array):
+            self.array = flickerCorrection(self.array, statistic=statistic, percentile=percentile, target=target, window=window, dtype=dtype)
+
+        # Scale the corrected frames in a new array, to keep the old one if cancelled
+        else:
+            self.array = flickerCorrection(self.array, statistic=statistic, percentile=percentile, target=target, window=window, out=self._empty_like(self.array), workers=workers, dtype=dtype, progress=progress)
+
+        # Update the displayed frame
+        self.frame.updateFrame( self.array[self.frame_nbr] )
+        self._clear_cache()
 
     # --------------------------------
     # Modify the contrast of the image
@@ -122,7 +405,8 @@ class ImageStack:
             max=max,
             percentile=percentile,
             percentile_min=percentile_min,
-            rescale=rescale
+            rescale=rescale,
+            histogram=self.frameHistogram()
             )
         self.frame._isCorrected = True
         self.frame._min_to_correct, self.frame._max_to_correct = old_limits
@@ -130,15 +414,75 @@ class ImageStack:
 
         # Apply the correction
         self.frame.contrastCorrection()
+        self._clear_frame_cache()
+
+    # --------------------------------------------
+    # Modify the contrast of all the frames of the stack
+    def stackContrastCorrection(self, min=None, max=None, percentile=10, percentile_min=None, rescale=True, per_frame=False, in_place=True, workers=None, dtype=None):
+
+        # Get the limits of each frame
+        if per_frame:
+            old_limits, new_limits = [], []
+            for number in range(self.array.shape[0]):
+
+                # Count the values without keeping all the histograms in memory
+                histogram = self._frame_histograms.get(number)
+                if histogram is None and _is_countable(self.array):
+                    histogram = _get_histogram(self.array[number])
+
+                frame_old_limits, frame_new_limits = setContrastCorrection(self.array[number], min=min, max=max, percentile=percentile, percentile_min=percentile_min, rescale=rescale, histogram=histogram)
+                old_limits.append(frame_old_limits)
+                new_limits.append(frame_new_limits)
+
+        # Get the limits of the whole stack
+        else:
+            old_limits, new_limits = setContrastCorrection(self.array, min=min, max=max, percentile=percentile, percentile_min=percentile_min, rescale=rescale, histogram=self.stackHistogram())
+
+        # Select the output array, dask arrays are always replaced
+        if isDask(self.array):
+            out = None
+        elif in_place:
+            self._copy_mapped_arrays()
+            out = self.array
+        else:
+            out = self._empty_like(self.array)
+
+        # Apply the correction
+        self.array = doStackContrastCorrection(self.array, old_limits, new_limits, out=out, workers=workers, dtype=dtype)
+
+        # Display the corrected array as it is
+        self.frame._isCorrected = False
+        self.frame.updateFrame( self.array[self.frame_nbr] )
+        self._clear_cache()
+
+    # ------------------------------------------------
+    # Project the stack along time, fully or on windows
+    def project(self, type='max', window=None, use_raw=False):
+
+        # Select the array to project
+        if use_raw:
+            array = self.source
+        else:
+            array = self.array
+
+        return temporalProjection(array, type=type, window=window)
 
     # -------------------------------
     # Reset the background correction
     def reset(self):
 
         # Reinitialise all defined values
-        self.array = np.copy(self.source)
+        if self.out_of_core:
+            self._copy_mapped_arrays()
+            for block in _frame_blocks(self.source):
+                self.array[block] = self.source[block]
+        elif isDask(self.source):
+            self.array = self.source
+        else:
+            self.array = np.copy(self.source)
         self.frame._isCorrected = False
         self.frame.updateFrame( self.array[self.frame_nbr] )
+        self._clear_cache()
 
     # --------------------------
     # Set the scale of the array
@@ -157,11 +501,65 @@ class ImageStack:
     ## IMAGE MODIFICATION
     ##-/-/-/-/-/-/-/-/-/
 
+    # -------------------------------------
+    # Add new frames at the end of the stack
+    def appendFrames(self, array):
+
+        # Format single frames
+        if len(array.shape) == 2:
+            array = np.reshape(array, (1, *array.shape))
+
+        # Check the size of the frames
+        if array.shape[1:] != self.source.shape[1:]:
+            raise Exception("The size of the new frames "+str(array.shape[1:])+" does not match the size of the stack "+str(self.source.shape[1:])+".")
+
+        # Add the frames to the arrays
+        self.source = self._extend_array('source', self.source, array)
+        self.array = self._extend_array('array', self.array, array)
+        self.n_frames = self.source.shape[0]
+
+        # The histograms of the previous frames are still valid
+        self._clear_frame_cache()
+
+    # -----------------------------------------------------------
+    # Add the frames arriving in a folder and correct their background
+    def watchFolder(self, path, average='mean', correction='division', signed_bits=False, interval=0.5, timeout=None):
+
+        # Initialise the reference with the frames already loaded
+        self.running_reference = RunningReference(type=average, signed_bits=signed_bits)
+        for frame in self.source:
+            self.running_reference.update(frame)
+
+        # Process the new frames
+        for frame in watchFolder(path, interval=interval, timeout=timeout):
+            self.appendFrames(frame)
+            self.running_reference.update(frame)
+
+            yield self.running_reference.correct(frame, correction=correction)
+
     # -------------------------------------------
     # Duplicate the class instance into a new one
     def duplicate(self):
+
+        # Copy the arrays in new scratch files
+        if self.out_of_core:
+            source, array = self.source, self.array
+            self.source, self.array = None, None
+            new_stack = deepcopy(self)
+            self.source, self.array = source, array
+
+            new_stack.source = copyToScratch(source, scratch_dir=self.scratch_dir)
+            new_stack.array = copyToScratch(array, scratch_dir=self.scratch_dir)
+
+            return new_stack
+
         return deepcopy(self)
 
+    # --------------------------------------------------
+    # Publish the arrays in shared memory for other processes
+    def share(self):
+        return SharedStack(self)
+
     # ---------------------------------
     # Select a reduced number of frames
     def reducedRange(self, first=0, last=None):
@@ -183,6 +581,7 @@ class ImageStack:
 
         # Reload the frame
         self.frame.updateFrame( self.array[self.frame_nbr] )
+        self._clear_cache()
 
     # -------------------------------------
     # Crop all the arrays on the given size
@@ -194,40 +593,86 @@ class ImageStack:
 
         # Reload the frame
         self.frame.updateFrame( self.array[self.frame_nbr] )
+        self._clear_cache()
+
+    # ---------------------------------------
+    # Bin all the arrays in time and/or space
+    def bin(self, time=1, space=1, reduce='mean'):
+
+        # The space scale can only describe square pixels
+        time, bin_y, bin_x = _get_bin_sizes(time, space)
+        if bin_y != bin_x:
+            raise Exception("The space binning should be the same along X and Y to keep the space scale of the stack.")
+
+        # Bin the arrays
+        new_arrays = []
+        for array in [self.source, self.array]:
+
+            # Write the binned array on the disk
+            out = None
+            if self.out_of_core:
+                dtype, _ = _get_bin_types(array.dtype, reduce.lower(), time * bin_y * bin_x)
+                out = scratchArray((array.shape[0] // time, array.shape[1] // bin_y, array.shape[2] // bin_x), dtype, scratch_dir=self.scratch_dir)
+
+            new_arrays.append( binning(array, time=time, space=space, reduce=reduce, out=out) )
+
+        self.source, self.array = new_arrays
+        self.n_frames = self.source.shape[0]
+        self.size = self.source.shape[1:]
+
+        # Update the calibration
+        self.time_scale *= time
+        self.space_scale *= bin_x
+
+        # Reload the frame
+        self.frame_nbr = self.frame_nbr // time
+        self.frame.updateFrame( self.array[self.frame_nbr] )
+        self._clear_cache()
 
     # ----------------------------
     # Add a scale bar on the image
     def scaleBar(self, frame=None, scale_length=10, thickness=20, padding=10, white_bar=True, add_text=True, font='Arial.ttf', font_size=None):
 
-        # Modify all frames
-        if frame is None and len(self.array.shape) == 3:
-            new_array = []
+        # Modify all the frames of dask arrays at once
+        if frame is None and isDask(self.array):
+            self.array = scaleBar(self.array, space_unit=self.space_unit, space_scale=self.space_scale, scale_length=scale_length, thickness=thickness, padding=padding, white_bar=white_bar, add_text=add_text, font=font, font_size=font_size)
+
+        # Modify all frames, only the corner of the bar is written
+        elif frame is None and len(self.array.shape) == 3:
+            self._copy_mapped_arrays()
             for frameArray in self.array:
-                new_array.append( scaleBar(frameArray, space_unit=self.space_unit, space_scale=self.space_scale, scale_length=scale_length, thickness=thickness, padding=padding, white_bar=white_bar, add_text=add_text, font=font, font_size=font_size) )
-            self.array = np.array(new_array)
+                scaleBar(frameArray, space_unit=self.space_unit, space_scale=self.space_scale, scale_length=scale_length, thickness=thickness, padding=padding, white_bar=white_bar, add_text=add_text, font=font, font_size=font_size, out=frameArray)
 
         # Modify a single frame
         elif frame is not None and len(self.array.shape) == 3:
-            self.array[frame] = scaleBar(self.array[frame], space_unit=self.space_unit, space_scale=self.space_scale, scale_length=scale_length, thickness=thickness, padding=padding, white_bar=white_bar, add_text=add_text, font=font, font_size=font_size)
+            self._copy_mapped_arrays()
+            scaleBar(self.array[frame], space_unit=self.space_unit, space_scale=self.space_scale, scale_length=scale_length, thickness=thickness, padding=padding, white_bar=white_bar, add_text=add_text, font=font, font_size=font_size, out=self.array[frame])
 
         else:
             self.array = scaleBar(self.array, space_unit=self.space_unit, space_scale=self.space_scale, scale_length=scale_length, thickness=thickness, padding=padding, white_bar=white_bar, add_text=add_text, font=font, font_size=font_size)
 
         # Reload the frame
         self.frame.updateFrame( self.array[self.frame_nbr] )
+        self._clear_cache()
 
     # -----------------------------
     # Add time stamps on the frames
-    def timeStamps(self, font_size=None, font='Arial.ttf', padding=10, position='top', white_text=True):
+    def timeStamps(self, font_size=None, font='Arial.ttf', padding=10, position='top', white_text=True, progress=None):
 
         # Check if it's a sequence
         _check_multiple_frames(self.array)
 
+        # Stamp a copy of the array, on the disk for out-of-core stacks, to keep the old one if cancelled
+        out = None
+        if self.out_of_core:
+            out = self._empty_like(self.array)
+
         # Modify the image
-        self.array = timeStamps(self.array, time_unit=self.time_unit, time_scale=self.time_scale, font_size=font_size, font=font, padding=padding, position=position, white_text=white_text)
+        self.array = timeStamps(self.array, time_unit=self.time_unit, time_scale=self.time_scale, font_size=font_size, font=font, padding=padding, position=position, white_text=white_text, out=out, progress=progress)
 
-        # Reload the frame
+        # Update the displayed frame
         self.frame.updateFrame( self.array[self.frame_nbr] )
+        self._clear_cache()
 
     ##-\-\-\-\-\-\-\-\-\-\
     ## DISPLAYING FUNCTIONS
@@ -235,8 +680,15 @@ class ImageStack:
 
     # -------------------------------------------------
     # Display the pixel value distribution of the image
-    def showPVD(self, n_bins=1000, min=None, max=None, percentile=10, percentile_min=None, log_scale=None):
-        showPVDistribution(self.frame.raw, n_bins=n_bins, min=min, max=max, percentile=percentile, percentile_min=percentile_min, log_scale=log_scale)    
+    def showPVD(self, n_bins=1000, min=None, max=None, percentile=10, percentile_min=None, log_scale=None, stack=False):
+
+        # Select the distribution to display
+        if stack:
+            array, histogram = self.array, self.stackHistogram()
+        else:
+            array, histogram = self.frame.raw, self.frameHistogram()
+
+        showPVDistribution(array, n_bins=n_bins, min=min, max=max, percentile=percentile, percentile_min=percentile_min, log_scale=log_scale, histogram=histogram)
 
     # ------------------------
     # Change the current frame
@@ -245,9 +697,17 @@ class ImageStack:
         # Check if it's a sequence
         _check_multiple_frames(self.source)
 
+        # Check the value
+        if number < 0 or number >= self.array.shape[0]:
+            raise Exception("Frame number ("+str(number)+") not valid")
+
         # Update the memory
         self.frame_nbr = number
 
+        # Load the frame and prefetch the surrounding ones
+        raw, corrected = self._get_frame_cache().get(number)
+        self.frame.loadFrame(raw, corrected)
+
     # -----------------------------------------
     # Display the current frame with matplotlib
     def show(self, show_raw=False, cmap='gray', title=True):
@@ -264,13 +724,23 @@ class ImageStack:
 
         plt.show()
 
+    # ---------------------------------------------
+    # Browse the frames in an interactive viewer
+    def view(self, cmap='gray', title=True, fps=25):
+
+        # Open the viewer
+        viewer = StackViewer(self, cmap=cmap, title=title, fps=fps)
+        plt.show()
+
+        return viewer
+
     ##-\-\-\-\-\
     ## SAVE IMAGE
     ##-/-/-/-/-/
 
     # -----------------------------------------------
     # Save the frame currently selected and displayed
-    def saveFrame(self, name=None, extension='.tif', save_raw=False, bit_depth=16, rescale=True):
+    def saveFrame(self, name=None, extension='.tif', save_raw=False, bit_depth=16, rescale=True, tile_size=None, workers=None, progress=None):
 
         # Define the name
         if name is None:
@@ -283,11 +753,11 @@ class ImageStack:
             array = self.frame.corrected
 
         # Save the image
-        saveImage(array, name, default=extension, bit_depth=bit_depth, rescale=rescale)
+        saveImage(array, name, default=extension, bit_depth=bit_depth, rescale=rescale, tile_size=tile_size, workers=workers, progress=progress)
 
     # --------------------
     # Save the whole stack
-    def saveStack(self, name=None, extension='.tif', save_raw=False, bit_depth=16, rescale=True):
+    def saveStack(self, name=None, extension='.tif', save_raw=False, bit_depth=16, rescale=True, tile_size=None, workers=None, progress=None):
 
         # Define the name
         if name is None:
@@ -300,12 +770,19 @@ class ImageStack:
             array = self.array
 
         # Save the image
-        saveImage(array, name, default=extension, bit_depth=bit_depth, rescale=rescale)
+        saveImage(array, name, default=extension, bit_depth=bit_depth, rescale=rescale, tile_size=tile_size, workers=workers, progress=progress)
 
     # -------------------------
     # Save the stack as a video
-    def saveVideo(self, name='untitled.mp4', fps=25, video_codec='libx264'):
-        saveVideo(name, self.array, fps=fps, video_codec=video_codec)
+    def saveVideo(self, name='untitled.mp4', fps=25, video_codec='libx264', progress=None):
+        saveVideo(name, self.array, fps=fps, video_codec=video_codec, progress=progress)
+
+    # ---------------------------------------------------
+    # Save the arrays and the settings of the stack in a file
+    def saveSession(self, path, progress=None):
+
+        attributes, frame_attributes = _get_stack_attributes(self)
+        writeSession(path, {'source':self.source, 'array':self.array}, {'stack':attributes, 'frame':frame_attributes}, progress=progress)
 
     # ----------------------------------------
     # Save a montage using the selected frames
@@ -320,15 +797,103 @@ class ImageStack:
         # Save the montage
         saveImage(montageArray, name, default=extension, bit_depth=bit_depth, rescale=rescale)
 
+##-\-\-\-\-\-\-\-\-\-\
+## SHARED STACK CLASS
+##-/-/-/-/-/-/-/-/-/-/
+
+# --------------------------------------------------------------
+# Class to send a stack to other processes through shared memory
+class SharedStack:
+    def __init__(self, stack):
+
+        # Copy the arrays in shared memory blocks, block by block
+        self._blocks = []
+        self.names, self.shapes, self.dtypes = [], [], []
+        for array in [stack.source, stack.array]:
+            shared_block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            self._blocks.append(shared_block)
+
+            shared_array = np.ndarray(array.shape, dtype=array.dtype, buffer=shared_block.buf)
+            for block in _frame_blocks(array):
+                shared_array[block] = array[block]
+            del shared_array
+
+            self.names.append(shared_block.name)
+            self.shapes.append(array.shape)
+            self.dtypes.append(array.dtype)
+
+        # Keep the other attributes, without the arrays and caches
+        self.attributes, self.frame_attributes = _get_stack_attributes(stack)
+
+    # -------------------------------------------------
+    # Only send the names of the blocks to other processes
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_blocks'] = []
+        return state
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # -------------------------------------------------------
+    # Get a read-only stack using the arrays in shared memory
+    def attach(self):
+
+        # Load the arrays without copy
+        arrays = []
+        for name, shape, dtype in zip(self.names, self.shapes, self.dtypes):
+            shared_block = shared_memory.SharedMemory(name=name)
+            array = np.frombuffer(shared_block.buf, dtype=dtype, count=int(np.prod(shape)))
+
+            # Close the block once no array uses its memory anymore
+            finalizer = weakref.finalize(array.base, shared_block.close)
+            finalizer.atexit = False
+
+            array = array.reshape(shape)
+            array.flags.writeable = False
+            arrays.append(array)
+
+        stack = _restore_stack(self.attributes, self.frame_attributes, *arrays)
+        stack.out_of_core = False
+
+        return stack
+
+    # -------------------------------------------------
+    # Release the shared memory once all processes are done
+    def close(self):
+
+        for shared_block in self._blocks:
+            shared_block.close()
+            shared_block.unlink()
+
+        self._blocks = []
+
 ##-\-\-\-\-\-\-\-\
 ## PUBLIC FUNCTIONS
 ##-/-/-/-/-/-/-/-/
 
 # ---------------------------
 # Load the image into a class
-def getImageClass(array, name="Untitled"):
+def getImageClass(array, name="Untitled", out_of_core=False, scratch_dir=None):
 
     # Generate the stack
-    stack = ImageStack(array, name=name)
+    stack = ImageStack(array, name=name, out_of_core=out_of_core, scratch_dir=scratch_dir)
+
+    return stack
+
+# ----------------------------------------
+# Reopen a stack saved with .saveSession()
+def loadSession(path, in_memory=False):
+
+    # Map the arrays of the file
+    attributes, arrays = readSession(path, in_memory=in_memory)
+
+    # Rebuild the stack
+    attributes['stack']['size'] = tuple(attributes['stack']['size'])
+    stack = _restore_stack(attributes['stack'], attributes['frame'], arrays['source'], arrays['array'])
+    stack.out_of_core = stack.out_of_core and not in_memory
 
     return stack
@@ -1,12 +1,23 @@
-import ffmpeg
+from functools import partial
 from glob import glob
 import numpy as np
 import os
-from PIL import Image, ImageSequence
-import pims
-from skimage import io
+import time
 
 import microImage.correction as corr
+from microImage.lazy_import import lazyImport
+from microImage.modification import binFrames, binning as bin_array
+from microImage.progress import OperationCancelled, Progress
+from microImage.storage import framesToScratch, scratchArray, _frame_blocks, _map_tiles, _tile_size
+from microImage.video import VideoReader, isVideo, readVideo
+
+# Heavy dependencies, loaded on first use
+ffmpeg = lazyImport('ffmpeg')
+Image = lazyImport('PIL.Image')
+ImageSequence = lazyImport('PIL.ImageSequence')
+pims = lazyImport('pims')
+tifffile = lazyImport('tifffile')
+io = lazyImport('skimage.io')
 
 ##-\-\-\-\-\-\-\-\-\
 ## PRIVATE FUNCTIONS
@@ -14,7 +25,7 @@ import microImage.correction as corr
 
 # ----------------------------------------------------
 # Check that the extensions in the list are authorized
-def _check_extensions(list, extensions=['.tif','.png','.bmp','.gif','.jpg']):
+def _check_extensions(list, extensions=['.tif','.png','.bmp','.gif','.jpg'], allow_empty=False):
 
     new_list = []
 
@@ -27,14 +38,14 @@ def _check_extensions(list, extensions=['.tif','.png','.bmp','.gif','.jpg']):
             new_list.append(file)
 
     # Check that the new list is not empty
-    if len(new_list) == 0:
+    if len(new_list) == 0 and not allow_empty:
         raise Exception('The directory does not contain any valid file.')
     else:
         return new_list
 
 # ------------------------------
 # Open all the files in a folder
-def _open_folder(path):
+def _open_folder(path, out_of_core=False, scratch_dir=None, binning=None, calibration=None, progress=None):
 
     # Check all the files in the folder
     file_in_folder = glob( os.path.join(path, '*.*') )
@@ -45,12 +56,27 @@ def _open_folder(path):
 
     # Open all the images
     sequence = pims.ImageSequence( os.path.join(path, '*'+file_extension) )
+    n_frames = len(sequence)
+    frames = Progress(progress, 'loadImage', n_frames).track(sequence)
 
-    return np.array(sequence)
+    # Correct the raw frames while reading them
+    if calibration is not None:
+        frames = calibration.frames(frames)
+
+    # Bin the frames while reading them
+    if binning is not None:
+        time, space, reduce = binning
+        frames, n_frames = binFrames(frames, time=time, space=space, reduce=reduce), n_frames // time
+
+    # Write the frames directly on the disk
+    if out_of_core:
+        return framesToScratch(frames, n_frames, scratch_dir=scratch_dir)
+
+    return np.array(list(frames))
 
 # ----------------------
 # Open the selected file
-def _open_file(path):
+def _open_file(path, out_of_core=False, scratch_dir=None, binning=None, calibration=None, progress=None):
 
     # Check the extension of the given file
     file_path = _check_extensions( [path] )
@@ -61,23 +87,71 @@ def _open_file(path):
 
     # Deal with stacks (.tif) and animations (.gif)
     if 'n_frames' in dir(sequence):
+        n_frames = sequence.n_frames
+        frames = (np.array(frame) for frame in ImageSequence.Iterator(sequence))
+        frames = Progress(progress, 'loadImage', n_frames).track(frames)
 
-        # Extract all frames
-        stack = []
-        for frame in ImageSequence.Iterator(sequence):
-            stack.append( np.copy(np.array(frame)) )
+        # Correct the raw frames while reading them
+        if calibration is not None:
+            frames = calibration.frames(frames)
+
+        # Bin the frames while reading them
+        if binning is not None:
+            time, space, reduce = binning
+            frames, n_frames = binFrames(frames, time=time, space=space, reduce=reduce), n_frames // time
 
-        imageArray = np.array(stack)
+        # Write the frames directly on the disk
+        if out_of_core:
+            imageArray = framesToScratch(frames, n_frames, scratch_dir=scratch_dir)
+
+        # Extract all frames
+        else:
+            imageArray = np.array(list(frames))
 
     # Convert simple image type
     else:
         imageArray = np.array(sequence)
+        Progress(progress, 'loadImage', 1).update(1, nbytes=imageArray.nbytes)
 
         # Format the shape of all image arrays
         imageArray = np.reshape( imageArray, (1, *imageArray.shape) )
 
+        # Correct the raw image
+        if calibration is not None:
+            imageArray = calibration.apply(imageArray)
+
+        # Bin the image
+        if binning is not None:
+            time, space, reduce = binning
+            imageArray = bin_array(imageArray, time=time, space=space, reduce=reduce)
+
     return imageArray
 
+# ----------------------
+# Open the selected video
+def _open_video(path, out_of_core=False, scratch_dir=None, binning=None, calibration=None, progress=None):
+
+    # Decode the video directly in the array
+    if binning is None and calibration is None:
+        return readVideo(path, out_of_core=out_of_core, scratch_dir=scratch_dir, progress=progress)
+
+    # Correct and bin the frames while decoding them
+    with VideoReader(path) as video:
+        frames = Progress(progress, 'loadImage', len(video)).track(video)
+        n_frames = len(video)
+
+        if calibration is not None:
+            frames = calibration.frames(frames)
+
+        if binning is not None:
+            time, space, reduce = binning
+            frames, n_frames = binFrames(frames, time=time, space=space, reduce=reduce), n_frames // time
+
+        if out_of_core:
+            return framesToScratch(frames, n_frames, scratch_dir=scratch_dir)
+
+        return np.array(list(frames))
+
 # ----------------------------------------
 # Add an extension to the file if required
 def _add_extension(path, default=".tif"):
@@ -96,9 +170,9 @@ def _add_extension(path, default=".tif"):
 
     return path
 
-# ------------------------------------
-# Convert the image type and bit depth
-def _convert_bit_depth(array, bit_depth=8, rescale=True):
+# -------------------------------------------------
+# Get the limits used to convert the bit depth
+def _get_bit_depth_limits(array, bit_depth=8, rescale=True):
 
     # Check the bit depth
     if bit_depth not in [8,16]:
@@ -124,9 +198,23 @@ def _convert_bit_depth(array, bit_depth=8, rescale=True):
         old_max = np.amax(array)
 
     old_limits = (old_min, old_max)
-    new_array = corr._rescale_array(array, old_limits, new_limits)
 
-    return new_array.astype(data_type)
+    return data_type, old_limits, new_limits
+
+# ------------------------------------
+# Convert the image type and bit depth
+def _convert_bit_depth(array, bit_depth=8, rescale=True, dtype=None, out=None, limits=None):
+
+    # Get the parameters for the conversion
+    if limits is None:
+        limits = _get_bit_depth_limits(array, bit_depth=bit_depth, rescale=rescale)
+    data_type, old_limits, new_limits = limits
+
+    # Initialise the output array
+    if out is None:
+        out = np.empty(array.shape, dtype=data_type)
+
+    return corr._rescale_array(array, old_limits, new_limits, dtype=dtype, out=out)
 
 # -------------------------
 # Save a single frame image
@@ -138,34 +226,151 @@ def _save_frame(array, path):
     # Generate the image file
     io.imsave(path, array)
 
+# ---------------------------------------------------
+# Get the number of reduced resolutions of a tiled image
+def _get_pyramid_levels(shape, tile_size):
+
+    # Halve the image until it fits in a single tile
+    height, width = shape
+    n_levels = 0
+    while max(height, width) > tile_size and min(height, width) >= 2:
+        height, width = height // 2, width // 2
+        n_levels += 1
+
+    return n_levels
+
+# ----------------------------------------------------------------
+# Generate the converted tiles of a level and fill the next level
+def _level_tiles(level, convert, next_level=None, tile_size=None, workers=None, tracker=None, n_pixels=1):
+
+    # Process a single tile
+    def _process_tile(tile):
+        tile_array = convert(level[tile])
+
+        # Average the tile for the next level
+        binned_tile = None
+        if next_level is not None and min(tile_array.shape) >= 2:
+            binned_tile = bin_array(tile_array, space=2)
+
+        return tile_array, binned_tile
+
+    # Get the tiles in the order of the file
+    for (y, x), (tile_array, binned_tile) in _map_tiles(_process_tile, level.shape, tile_size=tile_size, workers=workers):
+        if binned_tile is not None:
+            next_level[y.start//2:y.start//2 + binned_tile.shape[0], x.start//2:x.start//2 + binned_tile.shape[1]] = binned_tile
+
+        yield tile_array
+        if tracker is not None:
+            tracker.update(tile_array.size / n_pixels, nbytes=tile_array.nbytes)
+
+# ------------------------------------------------
+# Save a large single frame as a tiled pyramidal TIFF
+def _save_tiled_image(array, path, bit_depth=8, rescale=True, tile_size=None, pyramid=True, workers=None, progress=None):
+
+    # Check the extension of the given file
+    path = _check_extensions( [path], extensions=['.tif'] )[0]
+
+    # Check the size of the tiles
+    if tile_size is None:
+        tile_size = _tile_size
+    if tile_size % 16 != 0:
+        raise Exception('The size of the tiles ('+str(tile_size)+') should be a multiple of 16.')
+
+    # Get the conversion limits of the whole image
+    limits = _get_bit_depth_limits(array, bit_depth=bit_depth, rescale=rescale)
+    data_type = limits[0]
+    convert = partial(_convert_bit_depth, limits=limits, dtype=corr._get_work_type(array))
+
+    # Use BigTIFF only when required, as it cannot be opened by all softwares
+    n_levels = _get_pyramid_levels(array.shape, tile_size) if pyramid else 0
+    big_tiff = array.size * np.dtype(data_type).itemsize * 4 / 3 > 2**32 - 2**25
+
+    # Count the progress in pixels of all the levels
+    tracker = Progress(progress, 'saveImage', 1)
+    n_pixels = sum([(array.shape[0] // 2**n) * (array.shape[1] // 2**n) for n in range(n_levels + 1)])
+
+    try:
+        with tifffile.TiffWriter(path, bigtiff=big_tiff) as tiff:
+
+            level = array
+            for n in range(n_levels + 1):
+
+                # Store the next level on the disk while writing this one
+                next_level = None
+                if n < n_levels:
+                    next_level = scratchArray((level.shape[0] // 2, level.shape[1] // 2), data_type)
+
+                # The reduced resolutions are stored in the sub-directories of the full image
+                if n == 0:
+                    options = {'subifds': n_levels}
+                else:
+                    options = {'subfiletype': 1}
+
+                tiles = _level_tiles(level, convert, next_level=next_level, tile_size=tile_size, workers=workers, tracker=tracker, n_pixels=n_pixels)
+                tiff.write(tiles, shape=level.shape, dtype=data_type, tile=(tile_size, tile_size), photometric='minisblack', **options)
+
+                # The next levels are already converted
+                level, convert = next_level, np.asarray
+
+    # Remove the partial file
+    except OperationCancelled:
+        os.remove(path)
+        raise
+
+# ------------------------------------------
+# Convert the frames of the array block by block
+def _convert_frames(array, limits):
+
+    # Use the precision of the whole array on all the blocks
+    work_type = corr._get_work_type(array)
+
+    for block in _frame_blocks(array, itemsize=work_type.itemsize):
+        converted_block = _convert_bit_depth(array[block], limits=limits, dtype=work_type)
+        for frame in converted_block:
+            yield frame
+
 # ---------------------
 # Save a whole sequence
-def _save_stack(array, path):
+def _save_stack(array, path, limits, progress=None):
 
     # Check the extension of the given file
     path = _check_extensions( [path], extensions=['.gif','.tif'] )[0]
 
+    # Convert the frames while saving them
+    data_type = limits[0]
+    frames = Progress(progress, 'saveImage', array.shape[0]).track( _convert_frames(array, limits) )
+
     # Generate a .gif animation
     if os.path.splitext(path)[1] == '.gif':
 
         # Check that .gif are only saved in 8 bits
-        if array.dtype != np.uint8:
+        if data_type != np.uint8:
             raise Exception('.gif animations can only be saved in 8 bits format.')
 
-        im = [Image.fromarray(img) for img in array]
+        im = [Image.fromarray(img) for img in frames]
         im[0].save(path, save_all=True, append_images=im[1:])
 
-    # Generate a .tif stack
+    # Generate a .tif stack, written frame by frame
     else:
-        io.imsave(path, array)
+        big_tiff = array.size * np.dtype(data_type).itemsize > 2**32 - 2**25
+        photometric = 'rgb' if len(array.shape) == 4 else 'minisblack'
+
+        try:
+            with tifffile.TiffWriter(path, bigtiff=big_tiff) as tiff:
+                tiff.write(frames, shape=array.shape, dtype=data_type, photometric=photometric)
+
+        # Remove the partial file
+        except OperationCancelled:
+            os.remove(path)
+            raise
 
 # ----------------------------------
 # Convert an array into a video file
-def _convert_to_RGB(array):
+def _convert_to_RGB(array, limits=None):
 
     # Check the bit depth
     if array.dtype != np.uint8:
-        array = _convert_bit_depth(array, bit_depth=8, rescale=True)
+        array = _convert_bit_depth(array, bit_depth=8, rescale=True, limits=limits)
 
     # Add new channels
     if len(array.shape) != 4:
@@ -174,45 +379,128 @@ def _convert_to_RGB(array):
 
     return array
 
+# ---------------------------------------------
+# Define the ffmpeg stream used to write a video
+def _get_video_stream(path, width, height, fps=25, video_codec='libx264'):
+
+    stream = ffmpeg.input('pipe:', format='rawvideo', pix_fmt='rgb24', s='{}x{}'.format(width, height))
+    stream = ffmpeg.output(stream, path, pix_fmt='yuv420p', vcodec=video_codec, r=fps)
+    stream = ffmpeg.overwrite_output(stream)
+
+    return stream
+
 # --------------------------------
 # Save the array into a video file
-def _save_video(path, array, fps=25, video_codec='libx264'):
+def _save_video(path, array, fps=25, video_codec='libx264', progress=None):
 
     # Check the extension of the given file
     path = _check_extensions( [path], extensions=['.mp4'] )[0]
 
-    # Get the informations from the array
-    n,height,width,channels = array.shape
+    # Get the conversion limits of the whole array
+    limits = None
+    if array.dtype != np.uint8:
+        limits = _get_bit_depth_limits(array, bit_depth=8, rescale=True)
 
     # Initialize the process
-    process = ffmpeg.input('pipe:', format='rawvideo', pix_fmt='rgb24', s='{}x{}'.format(width, height))
-    process = ffmpeg.output(process, path, pix_fmt='yuv420p', vcodec=video_codec, r=fps)
-    process = ffmpeg.overwrite_output(process)
+    height, width = array.shape[1], array.shape[2]
+    process = _get_video_stream(path, width, height, fps=fps, video_codec=video_codec)
     process = ffmpeg.run_async(process, pipe_stdin=True)
 
-    # Save all the frames
-    for frame in array:
-        process.stdin.write( frame.tobytes() )
+    tracker = Progress(progress, 'saveVideo', array.shape[0])
+    try:
 
-    # Terminate the process
-    process.stdin.close()
-    process.wait()
+        # Convert and write the frames block by block
+        for block in _frame_blocks(array, itemsize=3):
+            rgb_array = _convert_to_RGB(array[block], limits=limits)
+            process.stdin.write( rgb_array.tobytes() )
+            tracker.update(block.stop - block.start, nbytes=rgb_array.nbytes)
+
+        # Terminate the process
+        process.stdin.close()
+        process.wait()
+
+    # Stop ffmpeg and remove the partial video if the writing failed or was cancelled
+    except BaseException:
+        process.kill()
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+        process.wait()
+
+        if os.path.exists(path):
+            os.remove(path)
+        raise
 
 ##-\-\-\-\-\-\-\-\
 ## PUBLIC FUNCTIONS
 ##-/-/-/-/-/-/-/-/
 
+# ------------------------------------------------
+# Generate the frames of the files added to a folder
+def watchFolder(path, interval=0.5, timeout=None, include_existing=False):
+
+    # Initialise the memory of the files
+    loaded_files = set()
+    file_sizes = {}
+    last_frame_time = time.time()
+
+    # Ignore the files already in the folder
+    if not include_existing:
+        loaded_files = set( glob( os.path.join(path, '*.*') ) )
+
+    while True:
+
+        # List the new files of the folder
+        file_in_folder = sorted( glob( os.path.join(path, '*.*') ) )
+        file_in_folder = _check_extensions(file_in_folder, allow_empty=True)
+        new_files = [file for file in file_in_folder if file not in loaded_files]
+
+        # Only read the files that are not being written anymore
+        complete_files = []
+        for file in new_files:
+            size = os.path.getsize(file)
+            if file_sizes.get(file) == size:
+                complete_files.append(file)
+            file_sizes[file] = size
+
+        # Generate the frames of the new files
+        for file in complete_files:
+            for frame in _open_file(file):
+                yield frame
+
+            loaded_files.add(file)
+            del file_sizes[file]
+            last_frame_time = time.time()
+
+        # Stop when no new frame arrived for too long
+        if timeout is not None and time.time() - last_frame_time > timeout:
+            return
+
+        # Wait before checking the folder again
+        if len(complete_files) == 0:
+            time.sleep(interval)
+
 # ----------------------------------
 # Load an image, a stack or a folder
-def loadImage(path):
+def loadImage(path, out_of_core=False, scratch_dir=None, bin_time=1, bin_space=1, bin_reduce='mean', calibration=None, progress=None):
+
+    # Bin the frames while loading them
+    binning = None
+    if bin_time != 1 or not np.all(np.array(bin_space) == 1):
+        binning = (bin_time, bin_space, bin_reduce)
 
     # Check if it is a folder
     if os.path.isdir(path):
-        imageArray = _open_folder(path)
+        imageArray = _open_folder(path, out_of_core=out_of_core, scratch_dir=scratch_dir, binning=binning, calibration=calibration, progress=progress)
+
+    # Check if it is a video
+    elif os.path.isfile(path) and isVideo(path):
+        imageArray = _open_video(path, out_of_core=out_of_core, scratch_dir=scratch_dir, binning=binning, calibration=calibration, progress=progress)
 
     # Check if it is a file
     elif os.path.isfile(path):
-        imageArray = _open_file(path)
+        imageArray = _open_file(path, out_of_core=out_of_core, scratch_dir=scratch_dir, binning=binning, calibration=calibration, progress=progress)
 
     # Abort if the file is not recognized
     else:
@@ -221,30 +509,44 @@ def loadImage(path):
     # Return the appropriate object
     return imageArray
 
+# --------------------------------------------
+# Open a video to read its frames on request
+def openVideo(path):
+    return VideoReader(path)
+
 # ----------------------
 # Save an image or stack
-def saveImage(array, path, default=".tif", bit_depth=8, rescale=True):
+def saveImage(array, path, default=".tif", bit_depth=8, rescale=True, tile_size=None, pyramid=True, workers=None, progress=None):
 
     # Check the extension
     path = _add_extension(path, default=default)
 
-    # Convert the type
-    array = _convert_bit_depth(array, bit_depth=bit_depth, rescale=rescale)
+    # Save large single frames tile by tile
+    if tile_size is not None:
+        if len(array.shape) == 3:
+            if array.shape[0] != 1:
+                raise Exception('Only single frames can be saved as tiled images.')
+            array = array[0]
+
+        _save_tiled_image(array, path, bit_depth=bit_depth, rescale=rescale, tile_size=tile_size, pyramid=pyramid, workers=workers, progress=progress)
+        return
 
-    # Save a single frame
+    # Get the conversion limits of the whole array
+    limits = _get_bit_depth_limits(array, bit_depth=bit_depth, rescale=rescale)
+
+    # Save a single frame, once converted
     if len(array.shape) == 2 or array.shape[0] == 1:
+        array = _convert_bit_depth(array, limits=limits)
+        Progress(progress, 'saveImage', 1).update(1, nbytes=array.nbytes)
         _save_frame(array, path)
 
     # Save a stack or animation
     else:
-        _save_stack(array, path)
+        _save_stack(array, path, limits, progress=progress)
 
 # -------------------------
 # Save the array as a video
-def saveVideo(file_name, array, fps=25, video_codec='libx264'):
-
-    # Convert the array to the correct format
-    array = _convert_to_RGB(array)
+def saveVideo(file_name, array, fps=25, video_codec='libx264', progress=None):
 
-    # Create the video
-    _save_video(file_name, array, fps=fps, video_codec=video_codec)
+    # Convert the array and create the video, block by block
+    _save_video(file_name, array, fps=fps, video_codec=video_codec, progress=progress)
@@ -1,8 +1,19 @@
 import math
-import matplotlib.font_manager as fontman
 import numpy as np
 import os
-from PIL import ImageFont, Image, ImageDraw
+
+from microImage.lazy_import import lazyImport
+from microImage.progress import Progress
+from microImage.storage import isDask, _frame_blocks, _map_tiles
+
+# Heavy dependencies, loaded on first use
+fontman = lazyImport('matplotlib.font_manager')
+Image = lazyImport('PIL.Image')
+ImageDraw = lazyImport('PIL.ImageDraw')
+ImageFont = lazyImport('PIL.ImageFont')
+
+# Optional dependencies, only used with dask arrays
+da = lazyImport('dask.array')
 
 ##-\-\-\-\-\-\-\-\-\
 ## PRIVATE FUNCTIONS
@@ -161,18 +172,19 @@ def _generate_scale_text(scale_text, bar_position, image_size, font='Arial.ttf',
     topPosition = yPosition - (padding + textSize[1])
     leftPosition = xPosition
 
-    # Generate the image to draw
-    textImage = Image.new('L', image_size, color=(0))
+    # Only draw the corner of the image above the bar
+    top, left = max(topPosition, 0), max(leftPosition, 0)
+    textImage = Image.new('L', (image_size[1] - left, max(yPosition - top, 0)), color=(0))
 
     # Draw the text on the image
     textDrawing = ImageDraw.Draw(textImage)
-    textDrawing.text((leftPosition,topPosition), scale_text, fill=(255), font=textFont)
+    textDrawing.text((leftPosition - left, topPosition - top), scale_text, fill=(255), font=textFont)
 
-    return np.array(textImage)
+    return np.array(textImage), (top, left)
 
 # ----------------------------------------
 # Generate the text array to add on frames
-def _generate_time_text(time_list, image_size, font='Arial.ttf', padding=10, font_size=None, position='bottom'):
+def _generate_time_text(time_list, image_size, font='Arial.ttf', padding=10, font_size=None, position='bottom', longest_text=None):
 
     # Get the font path
     fontPath = _find_font(fontName = font)
@@ -182,7 +194,9 @@ def _generate_time_text(time_list, image_size, font='Arial.ttf', padding=10, fon
     sizeLimit = width - 2*padding
 
     # Get the font size
-    longestName = max(time_list, key=len)
+    longestName = longest_text
+    if longestName is None:
+        longestName = max(time_list, key=len)
     if font_size is None:
         font_size = _get_font_size(longestName, fontPath, sizeLimit)
 
@@ -200,7 +214,7 @@ def _generate_time_text(time_list, image_size, font='Arial.ttf', padding=10, fon
     for time in time_list:
 
         # Generate the image to draw
-        textImage = Image.new('L', image_size, color=(0))
+        textImage = Image.new('L', (width, height), color=(0))
 
         # Draw the text on the image
         textDrawing = ImageDraw.Draw(textImage)
@@ -210,16 +224,30 @@ def _generate_time_text(time_list, image_size, font='Arial.ttf', padding=10, fon
 
     return np.array(text_array)
 
+# ------------------------------------------
+# Print the time stamps on a chunk of frames
+def _stamp_chunk(array, time_list, image_size, font='Arial.ttf', padding=10, font_size=None, position='bottom', longest_text=None, color=0, block_info=None):
+
+    # Get the position of the chunk in the stack
+    first_frame = block_info[0]['array-location'][0][0]
+
+    # Generate the text array to print
+    textArray = _generate_time_text(time_list[first_frame:first_frame + array.shape[0]], image_size, padding=padding, font=font, font_size=font_size, position=position, longest_text=longest_text)
+
+    # Copy the text on the frames
+    imageArray = np.copy(array)
+    for i, textToAdd in enumerate(textArray):
+        imageArray[i][textToAdd == 255] = color
+
+    return imageArray
+
 ##-\-\-\-\-\-\-\-\
 ## PUBLIC FUNCTIONS
 ##-/-/-/-/-/-/-/-/
 
 # ----------------------------
 # Add a scale bar to the image
-def scaleBar(array, space_unit='px', space_scale=1, scale_length=20, thickness=20, padding=10, white_bar=False, add_text=False, font='Arial.ttf', font_size=None):
-
-    # Duplicate
-    imageArray = np.copy(array)
+def scaleBar(array, space_unit='px', space_scale=1, scale_length=20, thickness=20, padding=10, white_bar=False, add_text=False, font='Arial.ttf', font_size=None, out=None, workers=None):
 
     # Get the scale bar length in px
     if space_unit.lower() not in ['px','pixel']:
@@ -236,39 +264,70 @@ def scaleBar(array, space_unit='px', space_scale=1, scale_length=20, thickness=2
 
     # Set the color of the bar
     if white_bar:
-        color = np.iinfo(imageArray.dtype).max
+        color = np.iinfo(array.dtype).max
     else:
         color = 0
 
-    # Edit the array
-    imageArray[yMin:yMax, xMin:xMax] = color
-
-    # Add the text if required
+    # Generate the text above the bar if required
     if add_text:
-
-        # Generate the text
         scale_text = str(scale_length) + ' ' + space_unit
+        textArray, (textTop, textLeft) = _generate_scale_text(scale_text, (yMin, xMin), (array.shape[-2], array.shape[-1]), font=font, padding=padding, font_size=font_size, bar_length=bar_length)
+        textSlice = (Ellipsis, slice(textTop, textTop + textArray.shape[0]), slice(textLeft, textLeft + textArray.shape[1]))
 
-        # Generate the array
-        textArray = _generate_scale_text(scale_text, (yMin, xMin), (array.shape[-2], array.shape[-1]), font=font, padding=padding, font_size=font_size, bar_length=bar_length)
+    # Draw the bar and text on all the chunks of dask arrays
+    if isDask(array):
+        mask = np.zeros(array.shape[-2:], dtype=bool)
+        mask[yMin:yMax, xMin:xMax] = True
+        if add_text:
+            mask[textSlice][textArray == 255] = True
 
-        # Apply the text
-        imageArray[textArray == 255] = color
+        return da.where(mask, array.dtype.type(color), array)
 
-    return imageArray
+    # Duplicate, tile by tile
+    if out is None:
+        out = np.empty_like(array)
+
+    if out is not array:
+        def _copy_tile(tile):
+            tile = (Ellipsis, *tile)
+            out[tile] = array[tile]
+
+        for _ in _map_tiles(_copy_tile, array.shape[-2:], workers=workers):
+            pass
+
+    # Edit the corner of the array only
+    out[..., yMin:yMax, xMin:xMax] = color
+    if add_text:
+        out[textSlice][..., textArray == 255] = color
+
+    return out
 
 # -------------------------
 # Add time stamps on frames
-def timeStamps(array, time_unit='frame', time_scale=1, font_size=None, font='Arial.ttf', padding=10, position='bottom', white_text=False):
+def timeStamps(array, time_unit='frame', time_scale=1, font_size=None, font='Arial.ttf', padding=10, position='bottom', white_text=False, out=None, progress=None):
+
+    # Print the stamps on full frames of dask arrays when computed
+    if isDask(array):
+        imageArray = array.rechunk({1:-1, 2:-1})
 
     # Duplicate
-    imageArray = np.copy(array)
+    elif out is None:
+        imageArray = np.copy(array)
+
+    # Copy block by block in the output array
+    else:
+        imageArray = out
+        if imageArray is not array:
+            for block in _frame_blocks(array):
+                imageArray[block] = array[block]
 
     # Get the texts to print
     time_list = _format_time_text(imageArray.shape[0], time_scale=time_scale, time_unit=time_unit)
+    longestName = max(time_list, key=len)
 
-    # Generate the text array to print
-    textArray = _generate_time_text(time_list, (imageArray.shape[1], imageArray.shape[2]), padding=padding, font=font, font_size=font_size, position=position)
+    # Get the font size once for all the blocks
+    if font_size is None:
+        font_size = _get_font_size(longestName, _find_font(fontName = font), imageArray.shape[2] - 2*padding)
 
     # Select the text color
     if white_text:
@@ -276,9 +335,22 @@ def timeStamps(array, time_unit='frame', time_scale=1, font_size=None, font='Ari
     else:
         color = 0
 
-    # Copy the text on the image
-    for i, textToAdd in enumerate(textArray):
-        imageArray[i][textToAdd == 255] = color
+    # Stamp the chunks of dask arrays
+    if isDask(imageArray):
+        return imageArray.map_blocks(_stamp_chunk, time_list, (imageArray.shape[1], imageArray.shape[2]), font=font, padding=padding, font_size=font_size, position=position, longest_text=longestName, color=color, dtype=imageArray.dtype)
+
+    # Process the frames block by block
+    tracker = Progress(progress, 'timeStamps', imageArray.shape[0])
+    for block in _frame_blocks(imageArray, itemsize=1):
+
+        # Generate the text array to print
+        textArray = _generate_time_text(time_list[block], (imageArray.shape[1], imageArray.shape[2]), padding=padding, font=font, font_size=font_size, position=position, longest_text=longestName)
+
+        # Copy the text on the image
+        for i, textToAdd in enumerate(textArray):
+            imageArray[block.start + i][textToAdd == 255] = color
+
+        tracker.update(block.stop - block.start, nbytes=imageArray[block].nbytes)
 
     return imageArray
 
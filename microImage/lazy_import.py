@@ -0,0 +1,52 @@
+import importlib
+import sys
+
+##-\-\-\-\-\-\-\-\
+## LAZY MODULE CLASS
+##-/-/-/-/-/-/-/-/-/
+
+# -------------------------------------------------------
+# Class standing for a module until one of its attributes is used
+class LazyModule:
+    def __init__(self, name):
+
+        # Bypass the redirection of the attributes
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_module', None)
+
+    # ------------------------------------
+    # Import the module on the first call
+    def _load(self):
+
+        if self._module is None:
+            object.__setattr__(self, '_module', importlib.import_module(self._name))
+
+        return self._module
+
+    # ---------------------------------------
+    # Redirect the attributes to the module
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+
+    def __setattr__(self, attribute, value):
+        setattr(self._load(), attribute, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        return "<lazy module '"+self._name+"'>"
+
+##-\-\-\-\-\-\-\-\
+## PUBLIC FUNCTIONS
+##-/-/-/-/-/-/-/-/
+
+# ------------------------------------------------------
+# Import a module only when one of its attributes is used
+def lazyImport(name):
+
+    # Use the module if it is already imported
+    if name in sys.modules:
+        return sys.modules[name]
+
+    return LazyModule(name)
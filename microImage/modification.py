@@ -1,4 +1,11 @@
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+from microImage.lazy_import import lazyImport
+from microImage.storage import isDask, _get_block_size, _get_blocks
+
+# Optional dependencies, only used with dask arrays
+da = lazyImport('dask.array')
 
 ##-\-\-\-\-\-\-\-\-\
 ## PRIVATE FUNCTIONS
@@ -37,6 +44,80 @@ def _crop_array(array, top_left, bottom_right):
 
     return new_array
 
+# ------------------------------------
+# Get the binning sizes along each axis
+def _get_bin_sizes(time, space):
+
+    # Use the same binning along X and Y
+    if np.isscalar(space):
+        space = (space, space)
+
+    bin_x, bin_y = int(space[0]), int(space[1])
+    time = int(time)
+
+    if time < 1 or bin_x < 1 or bin_y < 1:
+        raise Exception("The binning sizes should be positive integers.")
+
+    return time, bin_y, bin_x
+
+# --------------------------------------------------
+# Get the type of the binned array and of its accumulator
+def _get_bin_types(dtype, reduce, n_values):
+
+    # Keep the type for the maximum
+    if reduce == 'max':
+        return dtype, dtype
+
+    # Integers are summed in a type large enough for all the values
+    if np.issubdtype(dtype, np.integer):
+        type_limits = np.iinfo(dtype)
+        accumulator_type = np.result_type(dtype, np.min_scalar_type(int(type_limits.max) * n_values), np.min_scalar_type(int(type_limits.min) * n_values))
+
+    # Floats are summed in double precision
+    else:
+        accumulator_type = np.float64
+
+    # Only the sum of integers changes the type of the array
+    if reduce == 'sum' and np.issubdtype(dtype, np.integer):
+        return accumulator_type, accumulator_type
+
+    return dtype, accumulator_type
+
+# -----------------------------------------
+# Get a view of the array split in the bins
+def _get_bin_view(array, time, bin_y, bin_x):
+
+    n_frames, y_max, x_max = array.shape
+    frame_stride, y_stride, x_stride = array.strides
+
+    # Split each axis in (bins, pixels in bin), without copy
+    shape = (n_frames // time, time, y_max // bin_y, bin_y, x_max // bin_x, bin_x)
+    strides = (frame_stride * time, frame_stride, y_stride * bin_y, y_stride, x_stride * bin_x, x_stride)
+
+    return as_strided(array, shape=shape, strides=strides, writeable=False)
+
+# ----------------------------------
+# Bin a dask array, chunk by chunk
+def _bin_dask(array, time, bin_y, bin_x, reduce='mean'):
+
+    axes = {0:time, 1:bin_y, 2:bin_x}
+    if reduce == 'max':
+        return da.coarsen(np.max, array, axes, trim_excess=True)
+
+    # Sum in the accumulator type
+    n_values = time * bin_y * bin_x
+    dtype, accumulator_type = _get_bin_types(array.dtype, reduce, n_values)
+    binned_array = da.coarsen(np.sum, array, axes, trim_excess=True, dtype=accumulator_type)
+
+    # Average with a rounding of the integers
+    if reduce == 'mean':
+        if np.issubdtype(accumulator_type, np.integer):
+            binned_array = (binned_array + n_values // 2) // n_values
+        else:
+            binned_array = binned_array / n_values
+
+    return binned_array.astype(dtype)
+
 ##-\-\-\-\-\-\-\-\
 ## PUBLIC FUNCTIONS
 ##-/-/-/-/-/-/-/-/
@@ -52,3 +133,78 @@ def crop(array, top_left=(0,0), bottom_right=None):
     new_array = _crop_array(array, top_left[::-1], bottom_right[::-1])
 
     return new_array
+
+# --------------------------------------
+# Bin the array in time and/or in space
+def binning(array, time=1, space=1, reduce='mean', out=None):
+
+    # Check the reduction
+    reduce = reduce.lower()
+    if reduce not in ['mean', 'sum', 'max']:
+        raise Exception("Binning reduction ("+str(reduce)+") not recognized. Please pick between the given choices (mean/sum/max).")
+
+    time, bin_y, bin_x = _get_bin_sizes(time, space)
+
+    # Format single frames
+    is_frame = len(array.shape) == 2
+    if is_frame:
+        array = np.reshape(array, (1, *array.shape))
+
+    # Check the sizes
+    if time > array.shape[0] or bin_y > array.shape[1] or bin_x > array.shape[2]:
+        raise Exception("The binning sizes are larger than the array "+str(array.shape)+".")
+
+    # Reduce the aligned chunks of dask arrays
+    if isDask(array):
+        out = _bin_dask(array, time, bin_y, bin_x, reduce)
+        if is_frame:
+            return out[0]
+        return out
+
+    # Get the view and the output
+    view = _get_bin_view(array, time, bin_y, bin_x)
+    n_values = time * bin_y * bin_x
+    dtype, accumulator_type = _get_bin_types(array.dtype, reduce, n_values)
+
+    if out is None:
+        out = np.empty((view.shape[0], view.shape[2], view.shape[4]), dtype=dtype)
+
+    # Reduce the bins, block by block
+    block_size = max(_get_block_size(array.shape, itemsize=8) // time, 1)
+    for block in _get_blocks(view.shape[0], block_size):
+
+        if reduce == 'max':
+            np.amax(view[block], axis=(1,3,5), out=out[block])
+            continue
+
+        binned_block = np.sum(view[block], axis=(1,3,5), dtype=accumulator_type)
+
+        # Average with a rounding of the integers
+        if reduce == 'mean':
+            if np.issubdtype(accumulator_type, np.integer):
+                binned_block += n_values // 2
+                binned_block //= n_values
+            else:
+                binned_block /= n_values
+
+        out[block] = binned_block
+
+    # Return the frame in the same format
+    if is_frame:
+        return out[0]
+
+    return out
+
+# ------------------------------------------
+# Bin a sequence of frames while reading it
+def binFrames(frames, time=1, space=1, reduce='mean'):
+
+    # Group the frames to bin together
+    group = []
+    for frame in frames:
+        group.append( np.asarray(frame) )
+
+        # Bin the complete groups, the last incomplete one is dropped
+        if len(group) == time:
+            yield binning(np.array(group), time=time, space=space, reduce=reduce)[0]
+            group = []
@@ -0,0 +1,159 @@
+from glob import glob
+import math
+import numpy as np
+import os
+
+from microImage.input_output import _check_extensions
+from microImage.lazy_import import lazyImport
+from microImage.video import VideoReader, isVideo
+
+# Heavy dependencies, loaded on first use
+Image = lazyImport('PIL.Image')
+tifffile = lazyImport('tifffile')
+
+##-\-\-\-\-\-\-\-\-\
+## PRIVATE FUNCTIONS
+##-/-/-/-/-/-/-/-/-/
+
+# ------------------------------------------------
+# Get the list of frames to include in the preview
+def _get_preview_frames(n_frames, frames=None):
+
+    # Select all the frames
+    if frames is None:
+        return list( range(n_frames) )
+
+    # Select every N frames
+    elif isinstance(frames, int):
+        return list( range(0, n_frames, frames) )
+
+    # Select the given frames
+    frames = list(frames)
+    if len(frames) == 0 or max(frames) >= n_frames:
+        raise Exception("Indices in the frame list should be lower than the number of frames in the file ("+str(n_frames)+").")
+
+    return frames
+
+# -------------------------------------------------
+# Subsample a frame to fit in the size of the preview
+def _subsample(frame, max_size=256):
+
+    # Get the step between the pixels kept
+    step = max( math.ceil( max(frame.shape[0], frame.shape[1]) / max_size ), 1)
+
+    # Only copy the selected pixels, read from the disk for memory-mapped frames
+    return np.ascontiguousarray(frame[::step, ::step])
+
+# -----------------------------------------------------
+# Read a JPEG file, decoded directly at a lower resolution
+def _preview_jpeg(path, max_size=256, frames=None):
+
+    _get_preview_frames(1, frames=frames)
+
+    with Image.open(path) as image:
+
+        # Let the decoder skip the details of the higher resolutions
+        image.draft(image.mode, (max_size, max_size))
+
+        return np.array([ _subsample(np.asarray(image), max_size=max_size) ])
+
+# ----------------------------------------------------------
+# Read a TIFF file from its reduced resolutions or its strides
+def _preview_tiff(path, max_size=256, frames=None):
+
+    with tifffile.TiffFile(path) as tiff:
+        levels = tiff.series[0].levels
+
+        # Use the smallest reduced resolution still larger than the preview
+        if len(tiff.pages) == 1 and len(levels) > 1:
+            _get_preview_frames(1, frames=frames)
+
+            level = levels[0]
+            for reduced_level in levels[1:]:
+                if max(reduced_level.shape[-2:]) >= max_size:
+                    level = reduced_level
+
+            return np.array([ _subsample(level.asarray(), max_size=max_size) ])
+
+        # Process the selected frames
+        preview = []
+        for i in _get_preview_frames(len(tiff.pages), frames=frames):
+
+            # Only read the selected rows of the uncompressed frames
+            if tiff.pages[i].is_memmappable:
+                frame = tifffile.memmap(path, page=i, mode='r')
+            else:
+                frame = tiff.pages[i].asarray()
+
+            preview.append( _subsample(frame, max_size=max_size) )
+
+    return np.array(preview)
+
+# ---------------------------------------------
+# Read any other file using Pillow and strides
+def _preview_other(path, max_size=256, frames=None):
+
+    with Image.open(path) as image:
+
+        # Process the selected frames
+        preview = []
+        for i in _get_preview_frames(getattr(image, 'n_frames', 1), frames=frames):
+            image.seek(i)
+            preview.append( _subsample(np.asarray(image), max_size=max_size) )
+
+    return np.array(preview)
+
+# ------------------------------------------
+# Read the selected frames of a video file
+def _preview_video(path, max_size=256, frames=None):
+
+    with VideoReader(path) as video:
+        preview = [_subsample(video.getFrame(i), max_size=max_size) for i in _get_preview_frames(len(video), frames=frames)]
+
+    return np.array(preview)
+
+# -----------------------------
+# Read the preview of a file
+def _preview_file(path, max_size=256, frames=None):
+
+    # Check the extension of the given file
+    if isVideo(path):
+        return _preview_video(path, max_size=max_size, frames=frames)
+    path = _check_extensions( [path] )[0]
+
+    # Use the shortcuts of the decoders
+    _, extension = os.path.splitext(path)
+    readers = {'.jpg':_preview_jpeg, '.tif':_preview_tiff}
+
+    return readers.get(extension, _preview_other)(path, max_size=max_size, frames=frames)
+
+##-\-\-\-\-\-\-\-\
+## PUBLIC FUNCTIONS
+##-/-/-/-/-/-/-/-/
+
+# ------------------------------------------------------
+# Load a small preview of an image, a stack or a folder
+def loadPreview(path, max_size=256, frames=None):
+
+    # Check if it is a folder
+    if os.path.isdir(path):
+
+        # Select the files the same way as when loading the folder
+        file_in_folder = _check_extensions( glob( os.path.join(path, '*.*') ) )
+        _, file_extension = os.path.splitext(file_in_folder[0])
+        file_in_folder = sorted( glob( os.path.join(path, '*'+file_extension) ) )
+
+        # Only read the selected files
+        preview = []
+        for i in _get_preview_frames(len(file_in_folder), frames=frames):
+            preview.append( _preview_file(file_in_folder[i], max_size=max_size, frames=[0])[0] )
+
+        return np.array(preview)
+
+    # Check if it is a file
+    elif os.path.isfile(path):
+        return _preview_file(path, max_size=max_size, frames=frames)
+
+    # Abort if the file is not recognized
+    else:
+        raise Exception('The input path is neither a file nor a directory.')
@@ -0,0 +1,359 @@
+from glob import glob
+import numpy as np
+import os
+import struct
+
+from microImage.input_output import _check_extensions
+from microImage.lazy_import import lazyImport
+from microImage.video import isVideo, _parse_video_header, _read_video_header
+
+# Heavy dependencies, loaded on first use
+Image = lazyImport('PIL.Image')
+
+# Names of the TIFF compression schemes
+_tiff_compressions = {1:'none', 2:'ccitt', 5:'lzw', 6:'ojpeg', 7:'jpeg', 8:'deflate', 32773:'packbits', 32946:'deflate', 34925:'lzma', 50000:'zstd', 50001:'webp'}
+
+# Size of the TIFF field types (in bytes)
+_tiff_type_sizes = {1:1, 2:1, 3:2, 4:4, 5:8, 6:1, 7:1, 8:2, 9:4, 10:8, 11:4, 12:8, 16:8, 17:8, 18:8}
+
+# Data type and number of channels of the PIL image modes
+_pil_modes = {'1':(np.bool_, 1), 'L':(np.uint8, 1), 'P':(np.uint8, 1), 'LA':(np.uint8, 2), 'RGB':(np.uint8, 3), 'RGBA':(np.uint8, 4), 'CMYK':(np.uint8, 4), 'YCbCr':(np.uint8, 3), 'I;16':(np.uint16, 1), 'I':(np.int32, 1), 'F':(np.float32, 1)}
+
+##-\-\-\-\-\-\-\-\-\
+## PRIVATE FUNCTIONS
+##-/-/-/-/-/-/-/-/-/
+
+# -----------------------------------------
+# Get the data type from the bits per sample
+def _get_data_type(bits, sample_format=1):
+
+    # Binary images
+    if bits == 1:
+        return np.dtype(np.bool_)
+
+    # Sample formats: 1 unsigned integer, 2 signed integer, 3 float
+    kind = {1:'u', 2:'i', 3:'f'}.get(sample_format, 'u')
+
+    return np.dtype(kind + str(max(bits // 8, 1)))
+
+# ------------------------------------------
+# Read the first value of a TIFF directory entry
+def _read_tiff_value(file, entry, byte_order, big_tiff):
+
+    # Get the structure of the entry
+    if big_tiff:
+        field_type, count = struct.unpack(byte_order+'HQ', entry[2:12])
+        value_field, field_size = entry[12:20], 8
+    else:
+        field_type, count = struct.unpack(byte_order+'HI', entry[2:8])
+        value_field, field_size = entry[8:12], 4
+
+    # Read the values stored elsewhere in the file
+    type_size = _tiff_type_sizes.get(field_type, 1)
+    if type_size * count > field_size:
+        offset = struct.unpack(byte_order + ('Q' if big_tiff else 'I'), value_field)[0]
+        position = file.tell()
+        file.seek(offset)
+        value_field = file.read(type_size)
+        file.seek(position)
+
+    # Decode the first value
+    if field_type == 3:
+        return struct.unpack(byte_order+'H', value_field[:2])[0]
+    elif field_type == 4:
+        return struct.unpack(byte_order+'I', value_field[:4])[0]
+    elif field_type == 16:
+        return struct.unpack(byte_order+'Q', value_field[:8])[0]
+
+    return value_field[0]
+
+# ------------------------------
+# Read the header of a TIFF file
+def _probe_tiff(file):
+
+    # Read the byte order and version
+    header = file.read(16)
+    byte_order = '<' if header[:2] == b'II' else '>'
+    version = struct.unpack(byte_order+'H', header[2:4])[0]
+
+    if version == 43:
+        big_tiff = True
+        offset = struct.unpack(byte_order+'Q', header[8:16])[0]
+        count_format, entry_size, offset_format = 'Q', 20, 'Q'
+    elif version == 42:
+        big_tiff = False
+        offset = struct.unpack(byte_order+'I', header[4:8])[0]
+        count_format, entry_size, offset_format = 'H', 12, 'I'
+    else:
+        raise Exception('The file is not a valid TIFF file.')
+
+    count_size = struct.calcsize(count_format)
+    offset_size = struct.calcsize(offset_format)
+
+    # Read the tags of the first directory
+    file.seek(offset)
+    n_entries = struct.unpack(byte_order+count_format, file.read(count_size))[0]
+    entries = file.read(n_entries * entry_size)
+
+    tags = {}
+    for i in range(n_entries):
+        entry = entries[i*entry_size:(i+1)*entry_size]
+        tag = struct.unpack(byte_order+'H', entry[:2])[0]
+        if tag in [256, 257, 258, 259, 277, 339]:
+            tags[tag] = _read_tiff_value(file, entry, byte_order, big_tiff)
+
+    # Count the directories by following the chain of offsets only
+    n_frames = 0
+    while offset != 0:
+        n_frames += 1
+        file.seek(offset)
+        n_entries = struct.unpack(byte_order+count_format, file.read(count_size))[0]
+        file.seek(offset + count_size + n_entries * entry_size)
+
+        next_offset = file.read(offset_size)
+        if len(next_offset) < offset_size:
+            break
+        offset = struct.unpack(byte_order+offset_format, next_offset)[0]
+
+    # Format the informations
+    compression = tags.get(259, 1)
+    return {
+        'n_frames': n_frames,
+        'height': tags.get(257, 0),
+        'width': tags.get(256, 0),
+        'channels': tags.get(277, 1),
+        'dtype': _get_data_type(tags.get(258, 1), tags.get(339, 1)),
+        'compression': _tiff_compressions.get(compression, str(compression)),
+        }
+
+# -----------------------------
+# Read the header of a PNG file
+def _probe_png(file):
+
+    # Read the IHDR chunk, always first in the file
+    header = file.read(33)
+    if header[:8] != b'\x89PNG\r\n\x1a\n' or header[12:16] != b'IHDR':
+        raise Exception('The file is not a valid PNG file.')
+
+    width, height, bit_depth, color_type = struct.unpack('>IIBB', header[16:26])
+
+    # Get the channels: 0 gray, 2 RGB, 3 palette, 4 gray + alpha, 6 RGBA
+    channels = {0:1, 2:3, 3:1, 4:2, 6:4}.get(color_type, 1)
+
+    # Pillow only keeps 16 bits for grayscale images
+    if color_type == 0 and bit_depth == 16:
+        dtype = np.dtype(np.uint16)
+    elif color_type == 0 and bit_depth == 1:
+        dtype = np.dtype(np.bool_)
+    else:
+        dtype = np.dtype(np.uint8)
+
+    # Look for an animation control chunk before the image data
+    n_frames = 1
+    while True:
+        chunk_header = file.read(8)
+        if len(chunk_header) < 8:
+            break
+
+        chunk_length, chunk_type = struct.unpack('>I4s', chunk_header)
+        if chunk_type == b'IDAT':
+            break
+        elif chunk_type == b'acTL':
+            n_frames = struct.unpack('>I', file.read(4))[0]
+            break
+
+        file.seek(chunk_length + 4, 1)
+
+    return {
+        'n_frames': n_frames,
+        'height': height,
+        'width': width,
+        'channels': channels,
+        'dtype': dtype,
+        'compression': 'deflate',
+        }
+
+# ------------------------------------
+# Skip the data sub-blocks of a GIF file
+def _skip_gif_blocks(file):
+
+    while True:
+        block_size = file.read(1)
+        if len(block_size) == 0 or block_size[0] == 0:
+            return
+        file.seek(block_size[0], 1)
+
+# -----------------------------
+# Read the header of a GIF file
+def _probe_gif(file):
+
+    # Read the logical screen descriptor
+    header = file.read(13)
+    if header[:3] != b'GIF':
+        raise Exception('The file is not a valid GIF file.')
+
+    width, height, flags = struct.unpack('<HHB', header[6:11])
+
+    # Skip the global color table
+    if flags & 0x80:
+        file.seek(3 * 2**((flags & 0x07) + 1), 1)
+
+    # Count the image descriptors without decoding the frames
+    n_frames = 0
+    while True:
+        separator = file.read(1)
+
+        # Image descriptor
+        if separator == b',':
+            n_frames += 1
+            descriptor = file.read(9)
+            if len(descriptor) < 9:
+                break
+
+            # Skip the local color table, the LZW code size and the data
+            if descriptor[8] & 0x80:
+                file.seek(3 * 2**((descriptor[8] & 0x07) + 1), 1)
+            file.seek(1, 1)
+            _skip_gif_blocks(file)
+
+        # Extension
+        elif separator == b'!':
+            file.seek(1, 1)
+            _skip_gif_blocks(file)
+
+        # Trailer or end of the file
+        else:
+            break
+
+    return {
+        'n_frames': n_frames,
+        'height': height,
+        'width': width,
+        'channels': 1,
+        'dtype': np.dtype(np.uint8),
+        'compression': 'lzw',
+        }
+
+# -----------------------------------------------
+# Read the header of any other file using Pillow
+def _probe_other(path):
+
+    # Pillow only reads the header when opening the file
+    with Image.open(path) as image:
+        dtype, channels = _pil_modes.get(image.mode, (np.uint8, len(image.getbands())))
+
+        # Get the name of the compression
+        if image.format == 'BMP':
+            compression = {0:'none', 1:'rle8', 2:'rle4', 3:'bitfields'}.get(image.info.get('compression', 0), 'unknown')
+        else:
+            compression = image.info.get('compression', {'JPEG':'jpeg'}.get(image.format, 'unknown'))
+
+        return {
+            'n_frames': getattr(image, 'n_frames', 1),
+            'height': image.height,
+            'width': image.width,
+            'channels': channels,
+            'dtype': np.dtype(dtype),
+            'compression': str(compression),
+            }
+
+# ------------------------------------------
+# Read the header of a video file using ffprobe
+def _probe_video(path):
+
+    header = _read_video_header(path)
+    width, height, n_frames, fps, pixel_format, dtype = _parse_video_header(header)
+
+    return {
+        'n_frames': n_frames,
+        'height': height,
+        'width': width,
+        'channels': 1,
+        'dtype': dtype,
+        'compression': header['streams'][0].get('codec_name', 'unknown'),
+        }
+
+# ---------------------------
+# Read the header of a file
+def _probe_file(path):
+
+    # Read the videos as grayscale stacks, as when loading them
+    if isVideo(path):
+        return _probe_video(path)
+
+    _, extension = os.path.splitext(path)
+
+    # Use the dedicated parsers
+    parsers = {'.tif':_probe_tiff, '.png':_probe_png, '.gif':_probe_gif}
+    if extension in parsers:
+        with open(path, 'rb') as file:
+            return parsers[extension](file)
+
+    return _probe_other(path)
+
+##-\-\-\-\-\-\-\-\-\
+## INFORMATION CLASS
+##-/-/-/-/-/-/-/-/-/
+
+# -------------------------------------------
+# Class to store the informations of an image
+class ImageInfo:
+    def __init__(self, path, n_frames, height, width, dtype, channels=1, compression='none', n_files=1):
+
+        # Extract the informations
+        self.path = path
+        self.n_frames = n_frames
+        self.height = height
+        self.width = width
+        self.dtype = dtype
+        self.channels = channels
+        self.compression = compression
+        self.n_files = n_files
+
+        # Estimate the size of the loaded array (in bytes)
+        self.nbytes = n_frames * height * width * channels * dtype.itemsize
+
+    # ------------------------------------------
+    # Get the shape of the array once loaded
+    @property
+    def shape(self):
+        if self.channels == 1:
+            return (self.n_frames, self.height, self.width)
+
+        return (self.n_frames, self.height, self.width, self.channels)
+
+    def __repr__(self):
+        return 'ImageInfo(path='+repr(self.path)+', shape='+str(self.shape)+', dtype='+str(self.dtype)+', nbytes='+str(self.nbytes)+', compression='+repr(self.compression)+')'
+
+##-\-\-\-\-\-\-\-\
+## PUBLIC FUNCTIONS
+##-/-/-/-/-/-/-/-/
+
+# --------------------------------------------------
+# Get the informations of an image without loading it
+def probeImage(path):
+
+    # Check if it is a folder
+    if os.path.isdir(path):
+
+        # Select the files the same way as when loading the folder
+        file_in_folder = _check_extensions( glob( os.path.join(path, '*.*') ) )
+        _, file_extension = os.path.splitext(file_in_folder[0])
+        file_in_folder = sorted( glob( os.path.join(path, '*'+file_extension) ) )
+
+        # Read the first file only
+        informations = _probe_file(file_in_folder[0])
+        informations['n_frames'] = len(file_in_folder)
+
+        return ImageInfo(path, n_files=len(file_in_folder), **informations)
+
+    # Check if it is a file
+    elif os.path.isfile(path):
+        if not isVideo(path):
+            path = _check_extensions( [path] )[0]
+
+        return ImageInfo(path, **_probe_file(path))
+
+    # Abort if the file is not recognized
+    else:
+        raise Exception('The input path is neither a file nor a directory.')
@@ -0,0 +1,131 @@
+import threading
+import time
+
+# Minimum time between two reports sent to the observer (in seconds)
+_report_interval = 0.1
+
+##-\-\-\-\-\-\-\-\
+## CANCELLATION
+##-/-/-/-/-/-/-/-/
+
+# ---------------------------------------------------
+# Exception raised when an operation has been cancelled
+class OperationCancelled(Exception):
+    pass
+
+##-\-\-\-\-\-\-\-\-\
+## PROGRESS CLASSES
+##-/-/-/-/-/-/-/-/-/
+
+# ------------------------------------------------------
+# Class sent to the observers to describe the progress
+class ProgressInfo:
+    def __init__(self, operation, frames, n_frames, nbytes, elapsed):
+
+        # Extract the informations
+        self.operation = operation
+        self.frames = frames
+        self.n_frames = n_frames
+        self.nbytes = nbytes
+        self.elapsed = elapsed
+
+        # Calculate the progress
+        if n_frames > 0:
+            self.fraction = min(frames / n_frames, 1)
+        else:
+            self.fraction = 1
+        self.done = self.fraction >= 1
+
+        # Calculate the throughput (in MB/s)
+        if elapsed > 0:
+            self.rate = nbytes / elapsed / 1024**2
+        else:
+            self.rate = 0
+
+        # Estimate the remaining time (in s)
+        if frames > 0:
+            self.eta = elapsed * (n_frames - frames) / frames
+        else:
+            self.eta = None
+
+    def __repr__(self):
+        return 'ProgressInfo(operation='+repr(self.operation)+', frames='+str(int(self.frames))+'/'+str(int(self.n_frames))+', rate='+'{:.1f}'.format(self.rate)+' MB/s)'
+
+# ---------------------------------------------------------
+# Base class of the observers, which can cancel the operation
+class ProgressObserver:
+    def __init__(self):
+        self._cancel_event = threading.Event()
+
+    # ------------------------------------------------
+    # Receive the progress of the operation, to replace
+    def update(self, info):
+        pass
+
+    # -----------------------------------------------------
+    # Ask the operation to stop at the end of the current block
+    def cancel(self):
+        self._cancel_event.set()
+
+    # ------------------------------------
+    # Check if the operation was cancelled
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def __call__(self, info):
+        self.update(info)
+        return not self.cancelled
+
+# ------------------------------------------------
+# Class to track an operation and report its progress
+class Progress:
+    def __init__(self, callback, operation, n_frames):
+
+        # Extract the informations
+        self.callback = callback
+        self.operation = operation
+        self.n_frames = n_frames
+
+        # Initialize the counters
+        self.frames = 0
+        self.nbytes = 0
+        self._start_time = time.perf_counter()
+        self._last_report = None
+
+    # ----------------------------------
+    # Stop the operation if it was cancelled
+    def _cancel(self):
+        raise OperationCancelled('The operation ('+self.operation+') has been cancelled.')
+
+    # ------------------------------------------------
+    # Add the frames processed and report to the observer
+    def update(self, frames=1, nbytes=0):
+
+        if self.callback is None:
+            return
+
+        self.frames += frames
+        self.nbytes += nbytes
+
+        # Check the observers cancelled from another thread at every block
+        if getattr(self.callback, 'cancelled', False):
+            self._cancel()
+
+        # Limit the number of reports, except for the first and the last ones
+        current_time = time.perf_counter()
+        if self._last_report is not None and self.frames < self.n_frames and current_time - self._last_report < _report_interval:
+            return
+        self._last_report = current_time
+
+        # Report and stop if the observer asks for it
+        info = ProgressInfo(self.operation, self.frames, self.n_frames, self.nbytes, current_time - self._start_time)
+        if self.callback(info) is False:
+            self._cancel()
+
+    # -------------------------------------------
+    # Report the progress while iterating on frames
+    def track(self, frames):
+        for frame in frames:
+            yield frame
+            self.update(1, nbytes=getattr(frame, 'nbytes', 0))
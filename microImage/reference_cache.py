@@ -0,0 +1,176 @@
+from collections import OrderedDict
+import hashlib
+import numpy as np
+import os
+import tempfile
+import threading
+
+# Number of frames read to compute the fingerprint of a stack
+_n_samples = 16
+
+# Cache shared by the background corrections, disabled until requested
+_reference_cache = None
+
+##-\-\-\-\-\-\-\-\-\
+## PRIVATE FUNCTIONS
+##-/-/-/-/-/-/-/-/-/
+
+# ------------------------------------------------------
+# Get the indices of the frames sampled for the fingerprint
+def _get_sampled_frames(n_frames, n_samples=_n_samples):
+
+    if n_frames <= n_samples:
+        return list( range(n_frames) )
+
+    # Always include the first and last frames
+    return sorted( set( np.linspace(0, n_frames - 1, n_samples).astype(int).tolist() ) )
+
+# -----------------------------------------------------
+# Get the key of a reference image in the caches
+def _get_key(fingerprint, average='mean', signed_bits=False):
+    return fingerprint + '_' + average.lower() + ('_signed' if signed_bits else '')
+
+##-\-\-\-\-\-\
+## CACHE CLASS
+##-/-/-/-/-/-/
+
+# ----------------------------------------------------------------
+# Class to keep the reference images in memory and on the disk
+class ReferenceCache:
+    def __init__(self, max_size=8, cache_dir=None):
+
+        # Number of references kept in memory
+        self.max_size = max_size
+
+        # Folder where the references are also saved, if any
+        self.cache_dir = cache_dir
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+        # Initialise the cache
+        self._references = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._references)
+
+    # -------------------------------------------
+    # Get the path of the file storing a reference
+    def _get_path(self, key):
+        return os.path.join(self.cache_dir, key + '.npy')
+
+    # --------------------------------------------
+    # Keep a reference in memory, removing the oldest
+    def _store(self, key, reference):
+
+        with self._lock:
+            self._references[key] = reference
+            self._references.move_to_end(key)
+
+            while len(self._references) > self.max_size:
+                self._references.popitem(last=False)
+
+    # -------------------------------------------------
+    # Get a reference from the memory or the disk, if any
+    def get(self, key):
+
+        # Look for the reference in memory
+        with self._lock:
+            if key in self._references:
+                self._references.move_to_end(key)
+                return self._references[key]
+
+        # Look for the reference on the disk
+        if self.cache_dir is not None and os.path.isfile(self._get_path(key)):
+            reference = np.load(self._get_path(key))
+            reference.setflags(write=False)
+            self._store(key, reference)
+
+            return reference
+
+        return None
+
+    # -----------------------------------
+    # Add a reference image to the cache
+    def put(self, key, reference):
+
+        # Protect the cached reference from modifications
+        reference = np.array(reference, dtype=np.float64)
+        reference.setflags(write=False)
+        self._store(key, reference)
+
+        # Write the file under a temporary name, so other processes never read it partially
+        if self.cache_dir is not None:
+            file_descriptor, temporary_path = tempfile.mkstemp(suffix='.npy', dir=self.cache_dir)
+            try:
+                with os.fdopen(file_descriptor, 'wb') as file:
+                    np.save(file, reference)
+                os.replace(temporary_path, self._get_path(key))
+
+            except BaseException:
+                os.remove(temporary_path)
+                raise
+
+        return reference
+
+    # -------------------------------------
+    # Remove the references from the cache
+    def clear(self, disk=False):
+
+        with self._lock:
+            self._references.clear()
+
+        # Delete the files of the references
+        if disk and self.cache_dir is not None:
+            for file_name in os.listdir(self.cache_dir):
+                if file_name.endswith('.npy'):
+                    os.remove( os.path.join(self.cache_dir, file_name) )
+
+##-\-\-\-\-\-\-\-\
+## PUBLIC FUNCTIONS
+##-/-/-/-/-/-/-/-/
+
+# -------------------------------------------------------
+# Get a fast fingerprint of the content of a stack
+def getFingerprint(array, n_samples=_n_samples):
+
+    # Hash the shape and type of the stack
+    fingerprint = hashlib.blake2b(digest_size=16)
+    fingerprint.update( repr( (tuple(array.shape), np.dtype(array.dtype).str) ).encode() )
+
+    # Hash a few frames spread over the whole stack
+    for i in _get_sampled_frames(array.shape[0], n_samples=n_samples):
+        fingerprint.update( np.ascontiguousarray(array[i]).data )
+
+    return fingerprint.hexdigest()
+
+# ---------------------------------------------
+# Get the cache used for the background references
+def getReferenceCache(cache=True):
+
+    # Use the given cache
+    if isinstance(cache, ReferenceCache):
+        return cache
+
+    # Do not use any cache
+    elif not cache:
+        return None
+
+    # Create the shared cache on first use
+    if _reference_cache is None:
+        setReferenceCache()
+
+    return _reference_cache
+
+# -----------------------------------------------
+# Set the size and the folder of the shared cache
+def setReferenceCache(max_size=8, cache_dir=None):
+    global _reference_cache
+
+    _reference_cache = ReferenceCache(max_size=max_size, cache_dir=cache_dir)
+
+# -------------------------------------------
+# Remove all the references of the shared cache
+def clearReferenceCache(disk=False):
+    if _reference_cache is not None:
+        _reference_cache.clear(disk=disk)
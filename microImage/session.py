@@ -0,0 +1,120 @@
+import json
+import numpy as np
+import os
+import struct
+
+from microImage.progress import Progress
+from microImage.storage import _frame_blocks
+
+# Signature and version written at the start of the session files
+_session_magic = b'MIMSESSION'
+_session_version = 1
+
+# Layout of the fixed part of the header: signature, version, header length and data offset
+_prefix_format = '<' + str(len(_session_magic)) + 'sHQQ'
+
+# The arrays start on page boundaries to be memory-mapped (in bytes)
+_alignment = 4096
+
+##-\-\-\-\-\-\-\-\-\
+## PRIVATE FUNCTIONS
+##-/-/-/-/-/-/-/-/-/
+
+# ----------------------------------------------
+# Get the next position aligned on a memory page
+def _align(position):
+    return -(-position // _alignment) * _alignment
+
+# ------------------------------------------------
+# Convert the numpy values of the header for JSON
+def _to_json(value):
+
+    if isinstance(value, np.generic):
+        return value.item()
+    elif isinstance(value, np.ndarray):
+        return value.tolist()
+
+    raise TypeError("The value "+repr(value)+" cannot be saved in the session.")
+
+# -----------------------------------------------------
+# Describe the position of the arrays in the data section
+def _get_array_layout(arrays):
+
+    layout = {}
+    position = 0
+    for name, array in arrays.items():
+        dtype = np.dtype(array.dtype)
+        layout[name] = {'shape':list(array.shape), 'dtype':dtype.str, 'offset':position}
+        position = _align(position + int(np.prod(array.shape)) * dtype.itemsize)
+
+    return layout
+
+##-\-\-\-\-\-\-\-\
+## PUBLIC FUNCTIONS
+##-/-/-/-/-/-/-/-/
+
+# ---------------------------------------------------------
+# Write the arrays and attributes in a single session file
+def writeSession(path, arrays, attributes, progress=None):
+
+    # Prepare the header
+    layout = _get_array_layout(arrays)
+    header = json.dumps({'attributes':attributes, 'arrays':layout}, default=_to_json).encode('utf-8')
+    data_offset = _align(struct.calcsize(_prefix_format) + len(header))
+
+    tracker = Progress(progress, 'saveSession', sum([array.shape[0] for array in arrays.values()]))
+
+    # Write the file under a temporary name, so a session being read is never overwritten partially
+    temporary_path = path + '.tmp'
+    try:
+        with open(temporary_path, 'wb') as file:
+            file.write( struct.pack(_prefix_format, _session_magic, _session_version, len(header), data_offset) )
+            file.write(header)
+
+            # Write the raw arrays block by block
+            for name, array in arrays.items():
+                file.seek(data_offset + layout[name]['offset'])
+                for block in _frame_blocks(array):
+                    frames = np.ascontiguousarray(array[block])
+                    file.write( memoryview(frames).cast('B') )
+                    tracker.update(block.stop - block.start, nbytes=frames.nbytes)
+
+        os.replace(temporary_path, path)
+
+    except BaseException:
+        if os.path.isfile(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+# -------------------------------------------------------
+# Read the attributes and map the arrays of a session file
+def readSession(path, in_memory=False):
+
+    # Read the header
+    with open(path, 'rb') as file:
+        prefix = file.read( struct.calcsize(_prefix_format) )
+        if len(prefix) < struct.calcsize(_prefix_format):
+            raise Exception('The file is not a valid microImage session.')
+
+        magic, version, header_length, data_offset = struct.unpack(_prefix_format, prefix)
+        if magic != _session_magic:
+            raise Exception('The file is not a valid microImage session.')
+        elif version > _session_version:
+            raise Exception('The session was saved with a newer version of microImage (version '+str(version)+').')
+
+        header = json.loads( file.read(header_length).decode('utf-8') )
+
+    # Map the arrays without reading them, copied in memory only when modified
+    arrays = {}
+    for name, description in header['arrays'].items():
+        shape, dtype = tuple(description['shape']), np.dtype(description['dtype'])
+        offset = data_offset + description['offset']
+
+        if in_memory:
+            array = np.fromfile(path, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape)
+        else:
+            array = np.memmap(path, dtype=dtype, mode='c', shape=shape, offset=offset)
+
+        arrays[name] = array
+
+    return header['attributes'], arrays
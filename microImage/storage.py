@@ -0,0 +1,145 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import os
+import tempfile
+
+##-\-\-\-\-\-\-\-\-\
+## PRIVATE FUNCTIONS
+##-/-/-/-/-/-/-/-/-/
+
+# Memory allocated to each block of data being processed (in bytes)
+_block_memory = 64 * 1024**2
+
+# Size of the square tiles of large images (in pixels, multiple of 16 for TIFF files)
+_tile_size = 512
+
+# ---------------------------------------------------------
+# Get the number of slices along the axis fitting in a block
+def _get_block_size(shape, itemsize=8, axis=0, block_memory=None):
+
+    # Use the default memory budget
+    if block_memory is None:
+        block_memory = _block_memory
+
+    # Calculate the size of a single slice
+    slice_size = int(np.prod(shape)) // max(shape[axis], 1)
+    slice_bytes = max(slice_size * itemsize, 1)
+
+    return max(block_memory // slice_bytes, 1)
+
+# ----------------------------------------
+# Generate the slices of the blocks to process
+def _get_blocks(n_elements, block_size):
+
+    # Split the range in consecutive blocks
+    for start in range(0, n_elements, block_size):
+        yield slice(start, min(start + block_size, n_elements))
+
+# ----------------------------------------------
+# Generate the slices of the frame blocks of an array
+def _frame_blocks(array, itemsize=None, block_memory=None):
+
+    # Get the size of the elements in memory
+    if itemsize is None:
+        itemsize = array.dtype.itemsize
+
+    block_size = _get_block_size(array.shape, itemsize=itemsize, block_memory=block_memory)
+
+    return _get_blocks(array.shape[0], block_size)
+
+# --------------------------------------------------
+# Generate the slices of the tiles covering an image
+def _get_tiles(shape, tile_size=None):
+
+    # Use the default tile size
+    if tile_size is None:
+        tile_size = _tile_size
+
+    # Go through the rows of tiles
+    for y in range(0, shape[0], tile_size):
+        for x in range(0, shape[1], tile_size):
+            yield slice(y, min(y + tile_size, shape[0])), slice(x, min(x + tile_size, shape[1]))
+
+# -----------------------------------------------------------
+# Process the tiles of an image in threads, returned in order
+def _map_tiles(function, shape, tile_size=None, workers=None):
+    return _map_blocks(function, _get_tiles(shape, tile_size=tile_size), workers=workers)
+
+# ----------------------------------------------------------
+# Process the blocks in threads, returned in order
+def _map_blocks(function, blocks, workers=None):
+
+    # Use all the processors by default
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+
+        # Only keep a few blocks in progress to bound the memory
+        n_pending = 2 * workers
+        pending = deque()
+        for block in blocks:
+            pending.append( (block, executor.submit(function, block)) )
+
+            if len(pending) >= n_pending:
+                block, future = pending.popleft()
+                yield block, future.result()
+
+        # Get the last blocks
+        while len(pending) > 0:
+            block, future = pending.popleft()
+            yield block, future.result()
+
+##-\-\-\-\-\-\-\-\
+## PUBLIC FUNCTIONS
+##-/-/-/-/-/-/-/-/
+
+# --------------------------------------------
+# Create an empty array in the scratch folder
+def scratchArray(shape, dtype, scratch_dir=None):
+
+    # Open an anonymous file, deleted when the array is released
+    scratch_file = tempfile.TemporaryFile(dir=scratch_dir)
+
+    return np.memmap(scratch_file, dtype=dtype, mode='w+', shape=tuple(shape))
+
+# ---------------------------------------
+# Copy an array into the scratch folder
+def copyToScratch(array, scratch_dir=None):
+
+    # Initialise the new array
+    new_array = scratchArray(array.shape, array.dtype, scratch_dir=scratch_dir)
+
+    # Copy block by block
+    for block in _frame_blocks(array):
+        new_array[block] = array[block]
+
+    return new_array
+
+# ------------------------------------------------
+# Write a sequence of frames into the scratch folder
+def framesToScratch(frames, n_frames, scratch_dir=None):
+
+    # Process all the frames
+    new_array = None
+    for i, frame in enumerate(frames):
+        frame = np.asarray(frame)
+
+        # Initialise the array with the first frame
+        if new_array is None:
+            new_array = scratchArray((n_frames, *frame.shape), frame.dtype, scratch_dir=scratch_dir)
+
+        new_array[i] = frame
+
+    return new_array
+
+# -----------------------------------
+# Check if an array is stored on disk
+def isOnDisk(array):
+    return isinstance(array, np.memmap)
+
+# ----------------------------------------------
+# Check if an array is a chunked dask array
+def isDask(array):
+    return type(array).__module__.split('.')[0] == 'dask'
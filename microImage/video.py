@@ -0,0 +1,241 @@
+import numpy as np
+import re
+import threading
+
+from microImage.lazy_import import lazyImport
+from microImage.progress import Progress
+from microImage.storage import scratchArray
+
+# Heavy dependencies, loaded on first use
+ffmpeg = lazyImport('ffmpeg')
+
+# Extensions of the video files that can be read
+_video_extensions = ['.avi', '.mp4', '.mov', '.mkv']
+
+# Maximum number of frames decoded and dropped instead of seeking
+_max_skip = 32
+
+##-\-\-\-\-\-\-\-\-\
+## PRIVATE FUNCTIONS
+##-/-/-/-/-/-/-/-/-/
+
+# ------------------------------------------
+# Read the informations of the video stream
+def _read_video_header(path):
+
+    # Read the header of the first video stream
+    probe = ffmpeg.probe(path, select_streams='v:0')
+    if len(probe['streams']) == 0:
+        raise Exception('The file does not contain any video stream.')
+
+    return probe
+
+# -----------------------------------------------------
+# Get the size, length and type of the frames from the header
+def _parse_video_header(probe):
+
+    stream = probe['streams'][0]
+
+    width, height = int(stream['width']), int(stream['height'])
+
+    # Get the framerate
+    numerator, denominator = stream.get('avg_frame_rate', '0/0').split('/')
+    if float(denominator) == 0 or float(numerator) == 0:
+        numerator, denominator = stream.get('r_frame_rate', '25/1').split('/')
+    fps = float(numerator) / float(denominator)
+
+    # Get the number of frames, or estimate it from the duration
+    if int(stream.get('nb_frames', 0)) > 0:
+        n_frames = int(stream['nb_frames'])
+    else:
+        duration = float(stream.get('duration', probe['format'].get('duration', 0)))
+        n_frames = int(round(duration * fps))
+
+    # Keep 16 bits for videos with more than 8 bits per sample
+    depth = re.search(r'(\d+)(le|be)$', stream.get('pix_fmt', ''))
+    if depth is not None and int(depth.group(1)) > 8:
+        pixel_format, dtype = 'gray16le', np.dtype('<u2')
+    else:
+        pixel_format, dtype = 'gray', np.dtype(np.uint8)
+
+    return width, height, n_frames, fps, pixel_format, dtype
+
+# ------------------------------------------------
+# Get the informations of the first video stream
+def _get_video_informations(path):
+    return _parse_video_header( _read_video_header(path) )
+
+# -------------------------------------------------
+# Start decoding the video as raw grayscale frames
+def _start_decoding(path, fps, pixel_format, start=0, n_frames=None):
+
+    # Seek to the first frame before decoding
+    input_options = {}
+    if start > 0:
+        input_options['ss'] = start / fps
+    stream = ffmpeg.input(path, **input_options)
+
+    # Write the raw frames in the pipe
+    output_options = {'format':'rawvideo', 'pix_fmt':pixel_format}
+    if n_frames is not None:
+        output_options['vframes'] = n_frames
+    stream = ffmpeg.output(stream, 'pipe:', **output_options)
+    stream = stream.global_args('-loglevel', 'error', '-nostdin')
+
+    return ffmpeg.run_async(stream, pipe_stdout=True)
+
+# ----------------------------------------
+# Read the next frame directly in the array
+def _read_frame(process, frame):
+
+    # Fill the memory of the frame with the bytes of the pipe
+    buffer = memoryview(frame).cast('B')
+    n_bytes = 0
+    while n_bytes < len(buffer):
+        n_read = process.stdout.readinto(buffer[n_bytes:])
+        if not n_read:
+            return False
+        n_bytes += n_read
+
+    return True
+
+# -----------------------
+# Stop the decoding process
+def _stop_decoding(process):
+
+    # Kill ffmpeg before closing the pipe, it only reads the file
+    if process.poll() is None:
+        process.kill()
+    process.stdout.close()
+    process.wait()
+
+##-\-\-\-\-\-\-\
+## VIDEO CLASS
+##-/-/-/-/-/-/-/
+
+# ------------------------------------------------
+# Class to read the frames of a video on request
+class VideoReader:
+    def __init__(self, path):
+
+        # Extract the informations
+        self.path = path
+        self.width, self.height, self.n_frames, self.fps, self._pixel_format, self.dtype = _get_video_informations(path)
+        self.shape = (self.n_frames, self.height, self.width)
+
+        # Initialize the decoding process
+        self._process = None
+        self._next_frame = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.n_frames
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # --------------------------------------------
+    # Restart the decoding at the selected frame
+    def _seek(self, number):
+
+        if self._process is not None:
+            _stop_decoding(self._process)
+
+        self._process = _start_decoding(self.path, self.fps, self._pixel_format, start=number)
+        self._next_frame = number
+
+    # ------------------------------
+    # Get a single frame of the video
+    def getFrame(self, number, out=None):
+
+        # Check the number
+        if number < 0:
+            number += self.n_frames
+        if number < 0 or number >= self.n_frames:
+            raise IndexError("The frame number ("+str(number)+") is out of range.")
+
+        if out is None:
+            out = np.empty((self.height, self.width), dtype=self.dtype)
+
+        with self._lock:
+
+            # Drop the frames until the selected one if it is close, otherwise seek
+            if self._process is None or number < self._next_frame or number - self._next_frame > _max_skip:
+                self._seek(number)
+
+            while self._next_frame <= number:
+                if not _read_frame(self._process, out):
+                    raise Exception("The frame "+str(self._next_frame)+" could not be decoded.")
+                self._next_frame += 1
+
+        return out
+
+    # --------------------------------------------
+    # Get a frame or a range of frames of the video
+    def __getitem__(self, key):
+
+        if isinstance(key, slice):
+            numbers = range(*key.indices(self.n_frames))
+            array = np.empty((len(numbers), self.height, self.width), dtype=self.dtype)
+            for i, number in enumerate(numbers):
+                self.getFrame(number, out=array[i])
+
+            return array
+
+        return self.getFrame(key)
+
+    # ----------------------------------
+    # Read all the frames one after another
+    def __iter__(self):
+        for number in range(self.n_frames):
+            yield self.getFrame(number)
+
+    # -----------------------------
+    # Stop the decoding process
+    def close(self):
+
+        with self._lock:
+            if self._process is not None:
+                _stop_decoding(self._process)
+                self._process = None
+
+##-\-\-\-\-\-\-\-\
+## PUBLIC FUNCTIONS
+##-/-/-/-/-/-/-/-/
+
+# -------------------------------------------
+# Check if the file can be read as a video
+def isVideo(path):
+    return path.lower().endswith( tuple(_video_extensions) )
+
+# ---------------------------------------------------
+# Read all the frames of a video in a grayscale array
+def readVideo(path, out_of_core=False, scratch_dir=None, progress=None):
+
+    width, height, n_frames, fps, pixel_format, dtype = _get_video_informations(path)
+
+    # Preallocate the array
+    if out_of_core:
+        array = scratchArray((n_frames, height, width), dtype, scratch_dir=scratch_dir)
+    else:
+        array = np.empty((n_frames, height, width), dtype=dtype)
+
+    # Decode the frames directly in the array
+    tracker = Progress(progress, 'loadImage', n_frames)
+    process = _start_decoding(path, fps, pixel_format, n_frames=n_frames)
+    n_read = 0
+    try:
+        while n_read < n_frames and _read_frame(process, array[n_read]):
+            n_read += 1
+            tracker.update(1, nbytes=array[0].nbytes)
+    finally:
+        _stop_decoding(process)
+
+    # Remove the frames missing from the estimation
+    if n_read < n_frames:
+        array = array[:n_read]
+
+    return array
@@ -0,0 +1,224 @@
+import numpy as np
+import time
+
+from microImage.correction import _get_histogram_limits
+from microImage.lazy_import import lazyImport
+
+# Heavy dependencies, loaded on first use
+plt = lazyImport('matplotlib.pyplot')
+widgets = lazyImport('matplotlib.widgets')
+
+##-\-\-\-\-\-\-\
+## VIEWER CLASS
+##-/-/-/-/-/-/-/
+
+# --------------------------------------------------
+# Class to browse the frames of a stack interactively
+class StackViewer:
+    def __init__(self, stack, cmap='gray', title=True, fps=25):
+
+        # Extract the informations
+        self.stack = stack
+        self.fps = fps
+        self.show_title = title
+
+        # Initialize the display memory
+        self.latencies = []
+        self._background = None
+        self._timer = None
+
+        # Get the limits of the display
+        value_min, value_max = self._get_value_range()
+        display_min, display_max = self._get_display_limits(value_min, value_max)
+
+        # Initialize the figure
+        self.figure = plt.figure()
+        self.canvas = self.figure.canvas
+        self.axes = self.figure.add_axes([0.05, 0.25, 0.9, 0.68])
+        self.axes.set_axis_off()
+
+        # Initialize the animated artists, only drawn by blitting
+        self.image = self.axes.imshow(self.stack.frame.raw, cmap=cmap, vmin=display_min, vmax=display_max, interpolation='nearest', animated=True)
+        self.title = self.axes.set_title(self._get_title(), animated=True)
+        self.title.set_visible(self.show_title)
+
+        # Initialize the sliders
+        self.sliders = []
+        self.frame_slider = None
+        if self.stack.array.shape[0] > 1:
+            self.frame_slider = widgets.Slider(self.figure.add_axes([0.15, 0.15, 0.7, 0.03]), 'Frame', 0, self.stack.array.shape[0] - 1, valinit=self.stack.frame_nbr, valstep=1, valfmt='%d')
+            self.frame_slider.on_changed(self._on_frame)
+            self.sliders.append(self.frame_slider)
+
+        self.min_slider = widgets.Slider(self.figure.add_axes([0.15, 0.09, 0.7, 0.03]), 'Min', value_min, value_max, valinit=display_min)
+        self.max_slider = widgets.Slider(self.figure.add_axes([0.15, 0.03, 0.7, 0.03]), 'Max', value_min, value_max, valinit=display_max)
+        for slider in [self.min_slider, self.max_slider]:
+            slider.on_changed(self._on_contrast)
+            self.sliders.append(slider)
+
+        # The sliders are redrawn by blitting
+        for slider in self.sliders:
+            slider.drawon = False
+
+        # Connect the events
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+        self.canvas.mpl_connect('key_press_event', self._on_key)
+
+    ##-\-\-\-\-\-\-\-\-\-\
+    ## DISPLAY PROPERTIES
+    ##-/-/-/-/-/-/-/-/-/-/
+
+    # --------------------------------------------
+    # Get the range of values of the current frame
+    def _get_value_range(self):
+
+        # Use the histogram if available
+        histogram = self.stack.frameHistogram()
+        if histogram is not None:
+            value_min, value_max = _get_histogram_limits(histogram)
+        else:
+            value_min, value_max = np.amin(self.stack.frame.raw), np.amax(self.stack.frame.raw)
+
+        # Avoid empty ranges
+        if value_max <= value_min:
+            value_max = value_min + 1
+
+        return float(value_min), float(value_max)
+
+    # ----------------------------------------
+    # Get the initial limits of the display
+    def _get_display_limits(self, value_min, value_max):
+
+        # Use the contrast correction of the stack
+        if self.stack.frame._isCorrected:
+            return float(self.stack.frame._min_to_correct), float(self.stack.frame._max_to_correct)
+
+        return value_min, value_max
+
+    # -----------------------------
+    # Get the title of the display
+    def _get_title(self):
+
+        title_text = self.stack.name
+        if self.stack.array.shape[0] > 1:
+            title_text += ', frame: ' + str(self.stack.frame_nbr + 1)
+
+        return title_text
+
+    ##-\-\-\-\-\-\-\
+    ## BLITTING
+    ##-/-/-/-/-/-/-/
+
+    # -------------------------------------------------
+    # Draw the artists that are not in the background
+    def _draw_animated(self):
+        self.figure.draw_artist(self.image)
+        self.figure.draw_artist(self.title)
+
+    # ----------------------------------------------------
+    # Save the background after a full redraw of the figure
+    def _on_draw(self, event):
+        self._background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self._draw_animated()
+
+    # ------------------------------------------
+    # Redraw only the modified parts of the figure
+    def _update(self):
+
+        # Wait for the first full drawing of the figure
+        if self._background is None:
+            self.canvas.draw_idle()
+            return
+
+        # Draw the new artists on the saved background
+        self.canvas.restore_region(self._background)
+        self._draw_animated()
+        for slider in self.sliders:
+            self.figure.draw_artist(slider.ax)
+
+        self.canvas.blit(self.figure.bbox)
+        self.canvas.flush_events()
+
+    ##-\-\-\-\-\
+    ## CALLBACKS
+    ##-/-/-/-/-/
+
+    # -----------------------------
+    # Display the selected frame
+    def _on_frame(self, value):
+
+        start_time = time.perf_counter()
+
+        # Load the frame from the prefetching cache
+        self.stack.setFrame( int(value) )
+        self.image.set_data( self.stack.frame.raw )
+        self.title.set_text( self._get_title() )
+
+        # Update the display
+        self._update()
+
+        self.latencies.append( time.perf_counter() - start_time )
+
+    # -----------------------------------
+    # Modify the contrast of the display
+    def _on_contrast(self, value):
+        self.image.set_clim(self.min_slider.val, self.max_slider.val)
+        self._update()
+
+    # ----------------------------------
+    # Navigate using the keyboard
+    def _on_key(self, event):
+
+        if self.frame_slider is None:
+            return
+
+        # Move to the next or previous frame
+        if event.key == 'right':
+            self.nextFrame(step=1)
+        elif event.key == 'left':
+            self.nextFrame(step=-1)
+
+        # Start or stop the playback
+        elif event.key == ' ':
+            self.play()
+
+    ##-\-\-\-\-\-\-\-\
+    ## PUBLIC METHODS
+    ##-/-/-/-/-/-/-/-/
+
+    # ------------------------
+    # Change the current frame
+    def setFrame(self, number):
+        if self.frame_slider is not None:
+            self.frame_slider.set_val(number)
+
+    # ----------------------------------
+    # Move to the next frame of the stack
+    def nextFrame(self, step=1):
+        if self.frame_slider is not None:
+            n_frames = self.stack.array.shape[0]
+            self.setFrame( (self.stack.frame_nbr + step) % n_frames )
+
+    # ------------------------------
+    # Start or stop the playback
+    def play(self):
+
+        # Stop the current playback
+        if self._timer is not None:
+            self._timer.stop()
+            self._timer = None
+
+        # Start a new one at the selected framerate
+        else:
+            self._timer = self.canvas.new_timer(interval=int(1000 / self.fps))
+            self._timer.add_callback(self.nextFrame)
+            self._timer.start()
+
+    # ----------------------------------------------
+    # Get the mean and max time to change frame (s)
+    def frameLatency(self):
+
+        if len(self.latencies) == 0:
+            return None, None
+
+        return np.mean(self.latencies), np.amax(self.latencies)
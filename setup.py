@@ -29,5 +29,7 @@ setup(
         'Pillow',
         'pims',
         'scikit-image',
+        'scipy',
+        'tifffile',
     ]
 )
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+import tifffile
+
+import microImage as mim
+
+# ------------------------------------------------------
+# Remove the calibrations cached, even if the test fails
+@pytest.fixture(autouse=True)
+def clear_calibrations():
+    yield
+    mim.clearCalibrations()
+
+# ---------------------------------------------------------------
+# Write a raw stack with its dark and flat field frames in the folder
+@pytest.fixture
+def stacks(tmp_path):
+    rng = np.random.default_rng(0)
+
+    dark = rng.normal(100, 5, (5, 32, 40)).astype(np.uint16)
+    flat_field = np.linspace(0.5, 1.5, 40)[None,:] * np.ones((32,1))
+    flat = (dark.mean(axis=0) + 2000 * flat_field + rng.normal(0, 3, (5, 32, 40))).astype(np.uint16)
+    raw = (dark.mean(axis=0) + rng.integers(100, 1000, (10, 32, 40)) * flat_field).astype(np.uint16)
+
+    paths = {}
+    for name, array in [('dark', dark), ('flat', flat), ('raw', raw)]:
+        paths[name] = str(tmp_path / (name + '.tif'))
+        tifffile.imwrite(paths[name], array)
+
+    return paths, dark, flat, raw
+
+# ----------------------------------------------------
+# Calculate the calibrated stack from the master frames
+def _get_expected(dark, flat, raw, dtype=None):
+
+    master_dark = dark.mean(axis=0)
+    illumination = flat.mean(axis=0) - master_dark
+    gain = np.mean(illumination) / illumination
+    frames = (raw - master_dark) * gain
+
+    if dtype is None:
+        limits = np.iinfo(raw.dtype)
+        return np.clip(np.round(frames), limits.min, limits.max).astype(raw.dtype)
+
+    return frames.astype(dtype)
+
+# ---------------------------------------------------------------
+# The calibrated stack keeps the type of the raw frames
+def test_calibrated_load_keeps_raw_type(stacks):
+    paths, dark, flat, raw = stacks
+
+    calibration = mim.loadCalibration(dark=paths['dark'], flat=paths['flat'])
+    image = mim.loadImage(paths['raw'], calibration=calibration)
+
+    assert image.source.dtype == np.uint16
+    np.testing.assert_array_equal(image.source, _get_expected(dark, flat, raw))
+
+# ---------------------------------------------------------------
+# The background of a calibrated stack can be corrected
+def test_calibrated_load_then_background_correction(stacks):
+    paths, dark, flat, raw = stacks
+
+    calibration = mim.loadCalibration(dark=paths['dark'], flat=paths['flat'])
+    image = mim.loadImage(paths['raw'], calibration=calibration)
+    image.backgroundCorrection()
+
+    expected = mim.backgroundCorrection(_get_expected(dark, flat, raw))
+    np.testing.assert_allclose(image.array, expected, atol=np.iinfo(np.uint16).max * 1e-3)
+
+# ---------------------------------------------------------------
+# The single precision is kept when requested
+def test_calibration_in_single_precision(stacks):
+    paths, dark, flat, raw = stacks
+
+    calibration = mim.loadCalibration(dark=paths['dark'], flat=paths['flat'], dtype=np.float32)
+    image = mim.loadImage(paths['raw'], calibration=calibration)
+
+    assert image.source.dtype == np.float32
+    np.testing.assert_allclose(image.source, _get_expected(dark, flat, raw, dtype=np.float32), rtol=1e-4, atol=1e-2)